@@ -0,0 +1,159 @@
+# admin/exports.py
+"""
+Streaming CSV / NDJSON exports.
+
+Rows come from values() querysets read with .iterator(chunk_size=...), so memory use
+stays flat no matter how many rows are exported. The querysets are bound to the database
+the view routed to (a replica) before the response starts streaming.
+"""
+import csv
+from itertools import groupby
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from BackEnd.replicas import routed
+from Shop.models import Order, AuditLog
+from Shop.serializers import DateWindowSerializer
+from Payment.models import Payment
+
+CHUNK_SIZE = 2000       # rows fetched per database round trip
+ROWS_PER_WRITE = 500    # rows joined into one chunk of the response body
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+ORDER_FIELDS = ["id", "user_id", "user__username", "status", "total_price", "created_at"]
+ORDER_ITEM_FIELDS = {
+    "items__id": "id",
+    "items__variant_id": "variant_id",
+    "items__variant__product__name": "product",
+    "items__variant__size": "size",
+    "items__variant__price": "unit_price",
+    "items__quantity": "quantity",
+}
+PAYMENT_FIELDS = [
+    "id", "order_id", "user_id", "payment_method", "phone_number", "amount", "status",
+    "transaction_id", "receipt_number", "checkout_request_id", "result_desc", "created_at", "updated_at",
+]
+AUDIT_LOG_FIELDS = [
+    "id", "created_at", "action_type", "user_id", "user__username", "order_id", "product_id",
+    "variant_id", "old_status", "new_status", "quantity_delta", "payload", "description",
+]
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: returns each written line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def filter_window(queryset, params, status_field="status"):
+    """Apply ?start=, ?end= (on created_at, as in the audit log list) and ?status= filters."""
+    window = DateWindowSerializer(data={key: params[key] for key in ("start", "end") if params.get(key)})
+    window.is_valid(raise_exception=True)
+    if "start" in window.validated_data:
+        queryset = queryset.filter(created_at__gte=window.validated_data["start"])
+    if "end" in window.validated_data:
+        queryset = queryset.filter(created_at__lt=window.validated_data["end"])
+    if params.get("status"):
+        queryset = queryset.filter(**{status_field: params["status"]})
+    return queryset
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def csv_lines(rows, fields, headers=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers or fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def streaming_export(lines, fmt, name):
+    response = StreamingHttpResponse(_batched(lines), content_type=FORMATS[fmt])
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="{name}-{stamp}.{fmt}"'
+    return response
+
+
+def get_format(params):
+    fmt = params.get("fmt", "csv")
+    if fmt not in FORMATS:
+        raise ValidationError({"fmt": f"Choose one of: {', '.join(FORMATS)}."})
+    return fmt
+
+
+def export_orders(params):
+    """One CSV row per order item (orders without items get one row), or one NDJSON object per order."""
+    fmt = get_format(params)
+    rows = (
+        routed(filter_window(Order.objects.all(), params))
+        .order_by("id", "items__id")
+        .values(*ORDER_FIELDS, *ORDER_ITEM_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    if fmt == "csv":
+        headers = ORDER_FIELDS + [f"item_{name}" for name in ORDER_ITEM_FIELDS.values()]
+        return streaming_export(
+            csv_lines(rows, ORDER_FIELDS + list(ORDER_ITEM_FIELDS), headers), fmt, "orders"
+        )
+
+    def orders_with_items():
+        # Rows arrive sorted by order id, so each order's items are consecutive
+        for _, order_rows in groupby(rows, key=lambda row: row["id"]):
+            order_rows = list(order_rows)
+            order = {field: order_rows[0][field] for field in ORDER_FIELDS}
+            order["items"] = [
+                {name: row[field] for field, name in ORDER_ITEM_FIELDS.items()}
+                for row in order_rows
+                if row["items__id"] is not None
+            ]
+            yield order
+
+    return streaming_export(ndjson_lines(orders_with_items()), fmt, "orders")
+
+
+def export_payments(params):
+    fmt = get_format(params)
+    rows = (
+        routed(filter_window(Payment.objects.all(), params))
+        .order_by("id")
+        .values(*PAYMENT_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    lines = csv_lines(rows, PAYMENT_FIELDS) if fmt == "csv" else ndjson_lines(rows)
+    return streaming_export(lines, fmt, "payments")
+
+
+def export_audit_logs(params):
+    fmt = get_format(params)
+    rows = (
+        routed(filter_window(AuditLog.objects.all(), params, status_field="action_type"))
+        .order_by("id")
+        .values(*AUDIT_LOG_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    lines = csv_lines(rows, AUDIT_LOG_FIELDS) if fmt == "csv" else ndjson_lines(rows)
+    return streaming_export(lines, fmt, "audit-logs")
@@ -0,0 +1,73 @@
+# admin/management/commands/aggregate_profiles.py
+import glob
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def read_profiles(directory, route=None):
+    """{route: Counter(stack -> samples)} merged across the per-process files."""
+    profiles = defaultdict(Counter)
+    for path in sorted(glob.glob(os.path.join(directory, "*.folded"))):
+        name = os.path.basename(path).rsplit(".", 2)[0]
+        if route and name != route:
+            continue
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    profiles[name][stack] += int(count)
+    return profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the folded stacks written by the request profiler into one file per endpoint "
+        "(input for flamegraph.pl or speedscope) and list the functions most samples were in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile-dir", default=settings.PROFILE_DIR,
+            help="Directory the profiler writes to (default: PROFILE_DIR)",
+        )
+        parser.add_argument("--output-dir", help="Write <endpoint>.folded with the merged stacks here")
+        parser.add_argument("--route", help="Only this endpoint (URL name, e.g. admin-dashboard-summary)")
+        parser.add_argument("--top", type=int, default=10, help="Functions to list per endpoint")
+        parser.add_argument("--clear", action="store_true", help="Delete the per-process files once merged")
+
+    def handle(self, *args, **options):
+        profiles = read_profiles(options["profile_dir"], options["route"])
+        if not profiles:
+            self.stdout.write("No profiles found.")
+            return
+
+        for route, stacks in sorted(profiles.items(), key=lambda item: -item[1].total()):
+            total = stacks.total()
+            # Self samples: the innermost frame; inclusive: every function on the stack, once
+            own, inclusive = Counter(), Counter()
+            for stack, count in stacks.items():
+                frames = stack.split(";")
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+
+            self.stdout.write(f"\n{route}: {total} samples, {len(stacks)} distinct stacks")
+            for frame, count in own.most_common(options["top"]):
+                self.stdout.write(
+                    f"  {count / total:6.1%} self  {inclusive[frame] / total:6.1%} total  {frame}"
+                )
+
+            if options["output_dir"]:
+                os.makedirs(options["output_dir"], exist_ok=True)
+                path = os.path.join(options["output_dir"], f"{route}.folded")
+                with open(path, "w") as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+                self.stdout.write(f"  -> {path}")
+
+        if options["clear"]:
+            for path in glob.glob(os.path.join(options["profile_dir"], "*.folded")):
+                if not options["route"] or os.path.basename(path).rsplit(".", 2)[0] == options["route"]:
+                    os.remove(path)
@@ -0,0 +1,83 @@
+# admin/management/commands/benchmark_db_connections.py
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from BackEnd.db import pool_metrics
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure connection-acquire latency under concurrent load: each thread repeatedly "
+        "takes a connection, runs SELECT 1 and gives it back (to the pool, or closes it "
+        "when pooling is off)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--iterations", type=int, default=100, help="Acquisitions per thread")
+        parser.add_argument("--hold", type=float, default=0.005, help="Seconds each connection is held")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        timings, failures = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(options["threads"])
+
+        def worker():
+            connection = connections[alias]
+            own = []
+            start.wait()
+            try:
+                for _ in range(options["iterations"]):
+                    started = time.perf_counter()
+                    try:
+                        connection.ensure_connection()
+                    except Exception as exc:
+                        with lock:
+                            failures.append(exc)
+                        continue
+                    own.append(time.perf_counter() - started)
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    time.sleep(options["hold"])
+                    connection.close()
+            finally:
+                connection.close()
+                with lock:
+                    timings.extend(own)
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        wall = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall
+
+        metrics = pool_metrics()[alias]
+        self.stdout.write(
+            f"{options['threads']} threads x {options['iterations']} acquisitions on {alias!r} "
+            f"({'pooled' if metrics['pooled'] else 'no pool'}), {wall:.2f}s"
+        )
+        if timings:
+            timings.sort()
+            self.stdout.write(
+                "  acquire ms: "
+                + "  ".join(f"{label} {percentile(timings, fraction) * 1000:.2f}" for label, fraction in (
+                    ("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0),
+                ))
+            )
+        if failures:
+            self.stdout.write(self.style.WARNING(f"  {len(failures)} acquisitions failed: {failures[0]}"))
+        if metrics["pooled"]:
+            self.stdout.write(
+                "  pool: " + "  ".join(f"{name} {value}" for name, value in metrics.items() if name != "pooled")
+            )
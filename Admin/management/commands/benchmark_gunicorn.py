@@ -0,0 +1,153 @@
+# admin/management/commands/benchmark_gunicorn.py
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    """pid and all of its descendants."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        for task in os.listdir(f"/proc/{current}/task"):
+            try:
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+    return pids
+
+
+def memory_kb(pid, field):
+    """VmRSS from /proc/<pid>/status, or Pss from smaps_rollup (shared pages split between sharers)."""
+    path = f"/proc/{pid}/smaps_rollup" if field == "Pss" else f"/proc/{pid}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn (gunicorn.conf.py) once per worker model, drive it with concurrent "
+        "keep-alive clients and report requests/s, latency and memory (RSS and PSS, summed "
+        "over master and workers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", default="sync,gthread,uvicorn", help="Comma-separated worker models")
+        parser.add_argument("--path", default="/api/shop/products/?fields=id,name,price")
+        parser.add_argument("--clients", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load per model")
+        parser.add_argument("--workers", type=int, help="WEB_CONCURRENCY for every model (default: per model)")
+        parser.add_argument("--no-preload", action="store_true")
+
+    def handle(self, *args, **options):
+        host = next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+        rows = []
+        for model in options["models"].split(","):
+            rows.append((model, *self._measure(model.strip(), host, options)))
+
+        self.stdout.write(
+            f"{options['clients']} clients, {options['duration']:.0f}s each, GET {options['path']}"
+        )
+        self.stdout.write(f"  {'model':<8} {'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'errors':>6} {'RSS MB':>8} {'PSS MB':>8}")
+        for model, workers, rate, p50, p95, errors, rss, pss in rows:
+            self.stdout.write(
+                f"  {model:<8} {workers:>7} {rate:>9.1f} {p50:>8.1f} {p95:>8.1f} {errors:>6} "
+                f"{rss / 1024:>8.1f} {pss / 1024:>8.1f}"
+            )
+
+    def _measure(self, model, host, options):
+        port = free_port()
+        env = {**os.environ, "GUNICORN_WORKER_CLASS": model, "PORT": str(port)}
+        if options["workers"]:
+            env["WEB_CONCURRENCY"] = str(options["workers"])
+        if options["no_preload"]:
+            env["GUNICORN_PRELOAD"] = "false"
+        server = subprocess.Popen(
+            ["gunicorn", "--config", str(settings.BASE_DIR / "gunicorn.conf.py"), "--access-logfile", "/dev/null"],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_until_up(server, port, host, options["path"])
+            latencies, errors = self._load(port, host, options)
+            pids = process_tree(server.pid)
+            rss = sum(memory_kb(pid, "VmRSS") for pid in pids)
+            pss = sum(memory_kb(pid, "Pss") for pid in pids)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+        latencies.sort()
+        quantile = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else 0.0
+        return len(pids) - 1, len(latencies) / options["duration"], quantile(0.5), quantile(0.95), errors, rss, pss
+
+    def _wait_until_up(self, server, port, host, path, deadline=60):
+        started = time.monotonic()
+        while time.monotonic() - started < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with {server.returncode}")
+            try:
+                client = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                client.request("GET", path, headers={"Host": host})
+                client.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError("gunicorn did not start in time")
+
+    def _load(self, port, host, options):
+        latencies, errors = [], []
+        lock = threading.Lock()
+        stop_at = time.monotonic() + options["duration"]
+
+        def client():
+            own, failed = [], 0
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    connection.request("GET", options["path"], headers={"Host": host})
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        failed += 1
+                        continue
+                    if response.getheader("Connection", "").lower() == "close":
+                        connection.close()
+                except OSError:
+                    failed += 1
+                    connection.close()
+                    continue
+                own.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(own)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=client) for _ in range(options["clients"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, sum(errors)
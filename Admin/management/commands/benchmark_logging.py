@@ -0,0 +1,107 @@
+# admin/management/commands/benchmark_logging.py
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from BackEnd.logs import JSONFormatter, QueueingHandler
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class SlowStream:
+    """File-like sink whose writes take `delay` seconds, like a stdout pipe that is backing up."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of logger calls made by concurrent threads when records are "
+        "written synchronously (stream + rotating file, JSON) against the queue handler "
+        "used in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--records", type=int, default=2000, help="Records per thread")
+        parser.add_argument("--stream-delay-ms", type=float, default=0.0,
+                            help="Simulated cost of each write to the stream (a slow log collector)")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            delay = options["stream_delay_ms"] / 1000
+            specs = [
+                {"class": "Admin.management.commands.benchmark_logging.slow_stream_handler", "delay": delay},
+                {
+                    "class": "logging.handlers.RotatingFileHandler",
+                    "filename": os.path.join(directory, "queued.log"),
+                    "maxBytes": 10 * 1024 * 1024,
+                    "backupCount": 2,
+                },
+            ]
+            direct = [slow_stream_handler(delay), logging.handlers.RotatingFileHandler(
+                os.path.join(directory, "direct.log"), maxBytes=10 * 1024 * 1024, backupCount=2,
+            )]
+            for handler in direct:
+                handler.setFormatter(JSONFormatter())
+
+            queued = QueueingHandler(specs, queue_size=options["threads"] * options["records"])
+            results = {
+                "synchronous handlers": self._run(direct, options),
+                "queue handler": self._run([queued], options),
+            }
+            queued.stop()
+
+        self.stdout.write(
+            f"{options['threads']} threads x {options['records']} records, "
+            f"stream write {options['stream_delay_ms']} ms:"
+        )
+        for name, (timings, wall) in results.items():
+            self.stdout.write(
+                f"  {name:<22} p50 {percentile(timings, 0.5) * 1e6:7.1f} us  "
+                f"p99 {percentile(timings, 0.99) * 1e6:8.1f} us  max {timings[-1] * 1e3:7.2f} ms  "
+                f"{len(timings) / wall:9.0f} calls/s"
+            )
+
+    def _run(self, handlers, options):
+        logger = logging.getLogger(f"benchmark.logging.{id(handlers)}")
+        logger.handlers = handlers
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        timings, lock = [], threading.Lock()
+
+        def worker():
+            own = []
+            for index in range(options["records"]):
+                started = time.perf_counter()
+                logger.info("Order %s moved to %s", index, "paid", extra={"order_id": index, "status": "paid"})
+                own.append(time.perf_counter() - started)
+            with lock:
+                timings.extend(own)
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        wall = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall
+        return sorted(timings), wall
+
+
+def slow_stream_handler(delay):
+    return logging.StreamHandler(SlowStream(delay))
@@ -0,0 +1,52 @@
+# admin/management/commands/profile_imports.py
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from BackEnd.importtime import STARTUP_BUDGET_MS, by_package, profile_boot, total_ms
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile worker boot with `python -X importtime`: total import time against the "
+        "startup budget, time per top-level package (apps and dependencies) and the slowest "
+        "modules including what they import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Boots to profile; the median one is reported")
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument("--package", help="Only list modules of this top-level package")
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Fail when the median boot is over STARTUP_BUDGET_MS (run it on the deploy machine)",
+        )
+
+    def handle(self, *args, **options):
+        boots = sorted((profile_boot() for _ in range(options["runs"])), key=lambda boot: total_ms(boot.imports))
+        boot = boots[len(boots) // 2]
+        imports = boot.imports
+        if options["package"]:
+            imports = [entry for entry in imports if entry.module.split(".")[0] == options["package"]]
+
+        self.stdout.write(
+            f"Boot imports: {total_ms(boot.imports):.1f} ms (budget {STARTUP_BUDGET_MS} ms), "
+            f"{len(boot.modules)} modules, max RSS {boot.max_rss_kb / 1024:.1f} MB "
+            f"(median of {options['runs']}: "
+            f"{statistics.median(total_ms(b.imports) for b in boots):.1f} ms)"
+        )
+
+        self.stdout.write("\nBy package (self time):")
+        for package, (spent, count) in list(by_package(imports).items())[: options["top"]]:
+            self.stdout.write(f"  {package:<32} {spent:8.1f} ms  {count:4} modules")
+
+        self.stdout.write("\nSlowest modules (including their imports):")
+        for entry in sorted(imports, key=lambda entry: -entry.cumulative_us)[: options["top"]]:
+            self.stdout.write(
+                f"  {entry.module:<48} {entry.cumulative_us / 1000:8.1f} ms  (self {entry.self_us / 1000:.1f})"
+            )
+
+        if options["check"] and total_ms(boot.imports) > STARTUP_BUDGET_MS:
+            raise CommandError(
+                f"Boot imports take {total_ms(boot.imports):.1f} ms, over the {STARTUP_BUDGET_MS} ms budget."
+            )
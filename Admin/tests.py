@@ -1,3 +1,270 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+import zoneinfo
+from datetime import date, datetime, time as dt_time, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Auth.models import CustomUser
+from BackEnd.db import summarize
+from BackEnd.importtime import DEFERRED_MODULES, Boot, Import, profile_boot
+from BackEnd import metrics
+from BackEnd.logs import JSONFormatter, QueueingHandler, request_context
+from BackEnd.profiling import ProfilingMiddleware
+from BackEnd.renderers import ORJSONRenderer
+from BackEnd.replicas import ReplicaPinMiddleware, ReplicaRouter, is_pinned, replica_reads
+from BackEnd.storage import HashedMediaStorage
+from Shop.models import AuditLog, Product
+
+
+class DatabasePoolMetricsTests(TestCase):
+    def test_summarize_pool_stats(self):
+        stats = {"pool_min": 2, "pool_max": 10, "pool_size": 6, "pool_available": 1,
+                 "requests_waiting": 3, "requests_queued": 7, "requests_errors": 2}
+        summary = summarize(stats)
+        self.assertEqual(summary["in_use"], 5)
+        self.assertEqual(summary["waiting"], 3)
+        self.assertEqual(summary["waits"], 7)
+        self.assertEqual(summary["timeouts"], 2)
+        # Counters psycopg_pool has not reported yet read as zero
+        self.assertEqual(summary["connections_lost"], 0)
+
+    def test_dashboard_reports_unpooled_database(self):
+        admin = CustomUser.objects.create_user("admin@example.com", "admin", "Ad", "Min", "pw", user_type="admin")
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get("/api/admin/dashboard/database/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"default": {"pooled": False}})
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        caches["replica_pins"].clear()
+        self.user = CustomUser.objects.create_user("jane@example.com", "jane", "Jane", "Doe", "pw")
+
+    def test_only_opted_in_reads_go_to_the_replica(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), "replica_1")
+            self.assertEqual(router.db_for_write(Product), "default")
+        self.assertIsNone(router.db_for_read(Product))
+
+    def test_successful_writes_pin_the_user(self):
+        request = RequestFactory().get("/api/shop/products/")
+        request.user = self.user
+        ReplicaPinMiddleware(lambda request: HttpResponse())(request)
+        self.assertFalse(is_pinned(self.user))
+
+        request = RequestFactory().post("/api/shop/orders/")
+        request.user = self.user
+        ReplicaPinMiddleware(lambda request: HttpResponse(status=400))(request)
+        self.assertFalse(is_pinned(self.user))
+        ReplicaPinMiddleware(lambda request: HttpResponse(status=201))(request)
+        self.assertTrue(is_pinned(self.user))
+
+    def test_checking_a_pin_does_not_query_the_database(self):
+        request = RequestFactory().post("/api/shop/orders/")
+        request.user = self.user
+        with self.assertNumQueries(0):
+            ReplicaPinMiddleware(lambda request: HttpResponse(status=201))(request)
+            self.assertTrue(is_pinned(self.user))
+
+
+class StartupImportTests(TestCase):
+    def test_worker_boot_defers_request_only_modules(self):
+        # The time budget is machine-dependent; `profile_imports --check` enforces it
+        boot = profile_boot()
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, boot.modules, f"{module} is imported at boot")
+        self.assertNotIn("rest_framework.authtoken", boot.modules)
+
+    def test_profile_imports_check_enforces_the_budget(self):
+        boot = Boot([Import("BackEnd.wsgi", 900_000, 900_000, 0)], ["BackEnd.wsgi"], 50_000)
+        with mock.patch("Admin.management.commands.profile_imports.profile_boot", return_value=boot):
+            call_command("profile_imports", "--runs", "1", "--check", stdout=io.StringIO())
+            with mock.patch("Admin.management.commands.profile_imports.STARTUP_BUDGET_MS", 500):
+                with self.assertRaisesMessage(CommandError, "over the 500 ms budget"):
+                    call_command("profile_imports", "--runs", "1", "--check", stdout=io.StringIO())
+
+
+class StructuredLoggingTests(TestCase):
+    def test_request_id_is_taken_from_the_proxy_or_generated(self):
+        response = self.client.get("/api/shop/products/", HTTP_X_REQUEST_ID="edge-42")
+        self.assertEqual(response["X-Request-ID"], "edge-42")
+        response = self.client.get("/api/shop/products/", HTTP_X_REQUEST_ID="not valid\n")
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_records_are_json_with_request_id_and_extra_fields(self):
+        record = logging.LogRecord("Payment.views", logging.INFO, __file__, 1, "Callback %s", ("ok",), None)
+        record.payment_id = 7
+        with request_context("job-1"):
+            entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry["message"], "Callback ok")
+        self.assertEqual(entry["request_id"], "job-1")
+        self.assertEqual(entry["payment_id"], 7)
+
+    def test_unwritable_log_file_falls_back_to_stderr(self):
+        handler = QueueingHandler([{"class": "logging.FileHandler", "filename": "/proc/karathi/{pid}.log"}])
+        self.addCleanup(handler.stop)
+        record = logging.LogRecord("Payment.views", logging.WARNING, __file__, 1, "File handler fallback", (), None)
+        with mock.patch("sys.stderr", io.StringIO()) as stderr:
+            handler.handle(record)
+            handler.stop()
+        self.assertIn("disabled", stderr.getvalue())
+        self.assertIn('"File handler fallback"', stderr.getvalue())
+
+
+class MetricsTests(TestCase):
+    def test_endpoint_is_off_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="scrape")
+    def test_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.client.get("/api/shop/products/")
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="product-list",status="200"}', response.content.decode())
+
+    def test_gateway_error_statuses_are_counted(self):
+        errors = metrics.GATEWAY_ERRORS.labels("mpesa", "stk_push", "http_500")
+        before = errors._value.get()
+        with metrics.gateway_call("mpesa", "stk_push") as call:
+            call.track(HttpResponse(status=500))
+        self.assertEqual(errors._value.get(), before + 1)
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(PROFILE_DIR=self.directory, PROFILE_INTERVAL_MS=1, PROFILE_SAMPLE_RATE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.admin = CustomUser.objects.create_user("admin@example.com", "admin", "Ad", "Min", "pw", user_type="admin")
+
+    def profile(self, user, **headers):
+        def slow_view(request):
+            time.sleep(0.05)
+            return HttpResponse()
+
+        token = RefreshToken.for_user(user).access_token
+        request = RequestFactory().get("/api/admin/dashboard/summary/", HTTP_AUTHORIZATION=f"Bearer {token}", **headers)
+        return ProfilingMiddleware(slow_view)(request)
+
+    def test_only_admins_can_request_a_profile(self):
+        customer = CustomUser.objects.create_user("c@example.com", "c", "C", "Ustomer", "pw")
+        with mock.patch("BackEnd.profiling.sampler.start") as start:
+            self.profile(self.admin)
+            self.profile(customer, HTTP_X_PROFILE="1")
+            ProfilingMiddleware(HttpResponse)(RequestFactory().get("/", HTTP_X_PROFILE="1"))
+        start.assert_not_called()
+
+        self.profile(self.admin, HTTP_X_PROFILE="1")
+        [name] = os.listdir(self.directory)
+        self.assertEqual(name, f"unmatched.{os.getpid()}.folded")
+        with open(os.path.join(self.directory, name)) as f:
+            stack, count = f.readline().rsplit(" ", 1)
+        self.assertIn("slow_view", stack.split(";")[0])
+        self.assertGreater(int(count), 0)
+
+    def test_aggregate_merges_process_files(self):
+        for pid in (1, 2):
+            with open(os.path.join(self.directory, f"admin-dashboard-summary.{pid}.folded"), "w") as f:
+                f.write("summary (Admin/views.py:55);count (django/db/models/query.py:600) 3\n")
+        output = tempfile.mkdtemp(dir=self.directory)
+        call_command("aggregate_profiles", output_dir=output, stdout=open(os.devnull, "w"))
+        with open(os.path.join(output, "admin-dashboard-summary.folded")) as f:
+            self.assertEqual(f.read(), "summary (Admin/views.py:55);count (django/db/models/query.py:600) 6\n")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_user("admin@example.com", "admin", "Ad", "Min", "pw", user_type="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        for day in (30, 31):
+            entry = AuditLog.objects.create(action_type="other", description=f"March {day}")
+            AuditLog.objects.filter(pk=entry.pk).update(created_at=datetime(2026, 3, day, 23, 30, tzinfo=dt_timezone.utc))
+
+    def exported(self, **params):
+        response = self.client.get("/api/admin/export/audit-logs/", {"fmt": "ndjson", **params})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line)["description"] for line in b"".join(response.streaming_content).splitlines()]
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_date_end_includes_the_day_like_the_audit_log_list(self):
+        self.assertEqual(self.exported(start="2026-03-31", end="2026-03-31"), ["March 31"])
+        self.assertEqual(self.exported(end="2026-03-31T00:00:00Z"), ["March 30"])
+
+        listed = self.client.get("/api/shop/audit-logs/", {"start": "2026-03-31", "end": "2026-03-31"})
+        self.assertEqual([row["description"] for row in listed.json()], ["March 31"])
+
+        response = self.client.get("/api/admin/export/audit-logs/", {"end": "March"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_impossible_dates_are_rejected(self):
+        for url in ("/api/admin/export/audit-logs/", "/api/shop/audit-logs/"):
+            for name in ("start", "end"):
+                response = self.client.get(url, {name: "2026-02-30"})
+                self.assertEqual(response.status_code, 400, (url, name))
+                self.assertIn(name, response.json())
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.storage = HashedMediaStorage()
+
+    def test_concurrent_saves_of_the_same_bytes_share_one_name(self):
+        first = self.storage.save("products/palm.jpg", ContentFile(b"palm"))
+        # The second save checked for the file before the first one wrote it
+        with mock.patch.object(HashedMediaStorage, "exists", return_value=False):
+            second = self.storage.save("products/palm.jpg", ContentFile(b"palm"))
+        self.assertEqual(second, first)
+        self.assertEqual(os.listdir(self.storage.path("products")), [os.path.basename(first)])
+
+    def test_invalid_ranges_are_ignored(self):
+        name = self.storage.save("products/palm.jpg", ContentFile(b"0123456789"))
+        url = f"/media/{name}"
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=5-2").status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=20-").status_code, 416)
+        partial = self.client.get(url, HTTP_RANGE="bytes=2-4")
+        self.assertEqual((partial.status_code, b"".join(partial.streaming_content)), (206, b"234"))
+
+
+class RendererTests(TestCase):
+    def test_orjson_output_matches_drf(self):
+        data = {
+            "utc": datetime(2026, 3, 1, 9, 30, 5, 123456, tzinfo=dt_timezone.utc),
+            "london": datetime(2026, 1, 2, 3, 4, 5, tzinfo=zoneinfo.ZoneInfo("Europe/London")),
+            "naive": datetime(2026, 3, 1, 9, 30, 5, 7),
+            "day": date(2026, 3, 1),
+            "at": dt_time(1, 2, 3, 4),
+            "price": Decimal("12.50"),
+            "label": gettext_lazy("Paid"),
+            "id": uuid.UUID(int=1),
+            7: [None, True, 1.5],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
@@ -1,7 +1,7 @@
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, OrderViewSet, ProductViewSet,
-    PaymentViewSet, AuditLogViewSet, DashboardViewSet
+    PaymentViewSet, AuditLogViewSet, DashboardViewSet, ExportViewSet
 )
 
 router = DefaultRouter()
@@ -11,5 +11,6 @@ router.register("products", ProductViewSet, basename="admin-products")
 router.register("payments", PaymentViewSet, basename="admin-payments")
 router.register("audit-logs", AuditLogViewSet, basename="admin-auditlogs")
 router.register("dashboard", DashboardViewSet, basename="admin-dashboard")
+router.register("export", ExportViewSet, basename="admin-export")
 
 urlpatterns = router.urls
@@ -2,6 +2,9 @@ from rest_framework import viewsets, permissions
 from django.db.models import Sum, Count
 from django.utils.timezone import now, timedelta
 
+from BackEnd.db import pool_metrics
+from BackEnd.replicas import ReplicaReadMixin
+from .exports import export_orders, export_payments, export_audit_logs
 from .serializers import (
     UserSerializer, OrderSerializer, ProductSerializer,
     PaymentSerializer, AuditLogSerializer
@@ -16,27 +19,27 @@ class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.user_type == "admin"
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAdminUser]
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUser]
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAdminUser]
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class AuditLogViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all()
     serializer_class = AuditLogSerializer
     permission_classes = [IsAdminUser]
@@ -45,7 +48,7 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-class DashboardViewSet(viewsets.ViewSet):
+class DashboardViewSet(ReplicaReadMixin, viewsets.ViewSet):
     permission_classes = [IsAdminUser]
 
     @action(detail=False, methods=["get"])
@@ -64,3 +67,29 @@ class DashboardViewSet(viewsets.ViewSet):
             "total_users": total_users,
             "new_users_last_7_days": new_users
         })
+
+    @action(detail=False, methods=["get"])
+    def database(self, request):
+        """Connection pool gauges (in use, waiting) and counters (waits, timeouts) per database."""
+        return Response(pool_metrics())
+
+
+class ExportViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Streaming finance exports.
+    Query params: fmt=csv|ndjson, start/end (date or datetime, on created_at; a date end
+    includes that day, as in the audit log list), status (action_type for audit logs).
+    """
+    permission_classes = [IsAdminUser]
+
+    @action(detail=False, methods=["get"])
+    def orders(self, request):
+        return export_orders(request.query_params)
+
+    @action(detail=False, methods=["get"])
+    def payments(self, request):
+        return export_payments(request.query_params)
+
+    @action(detail=False, methods=["get"], url_path="audit-logs")
+    def audit_logs(self, request):
+        return export_audit_logs(request.query_params)
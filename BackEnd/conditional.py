@@ -0,0 +1,54 @@
+"""
+Conditional GET for API list and detail views.
+
+The ETag comes from one aggregate over the queryset being served, max(updated_at) plus
+a row count, instead of from hashing the rendered body. A request carrying a matching
+If-None-Match is answered with 304 before any rows are fetched or serialized. The count
+catches deletions, which do not move max(updated_at).
+
+No Last-Modified is sent: a date cannot express a deletion, so a client revalidating
+with If-Modified-Since alone would get a stale 304 after a row is deleted.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin: `self.conditional(queryset, build)` returns a 304 or Response(build()).
+
+    `version_aggregates` are aggregated over the served queryset and all of them go into
+    the ETag.
+    """
+    version_aggregates = {"updated": Max("updated_at"), "count": Count("pk")}
+
+    def etag(self, queryset):
+        version = queryset.order_by().aggregate(**self.version_aggregates)
+        request = self.request
+        key = "|".join(
+            str(part) for part in (
+                request.get_full_path(),
+                request.user.pk,
+                request.accepted_media_type,
+                *sorted(version.items()),
+            )
+        )
+        return quote_etag(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def conditional(self, queryset, build):
+        if self.request.method not in ("GET", "HEAD"):
+            return Response(build())
+
+        etag = self.etag(queryset)
+        response = get_conditional_response(self.request, etag=etag)
+        if response is None:
+            response = Response(build())
+        response["ETag"] = etag
+        # Always revalidate: the representation depends on the user and changes at any time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Authorization", "Accept"))
+        return response
@@ -0,0 +1,48 @@
+"""
+Connection pool metrics.
+
+With DATABASE_POOL on, each postgres alias gets a psycopg_pool.ConnectionPool (created
+lazily by Django on first use). `pool_metrics()` reads its counters without resetting
+them, so any number of scrapers can poll it.
+"""
+from django.db import connections
+
+# psycopg_pool counter -> our name. Counters only appear once they are non-zero.
+POOL_COUNTERS = {
+    "requests_num": "requests",
+    "requests_queued": "waits",
+    "requests_wait_ms": "wait_ms",
+    "requests_errors": "timeouts",
+    "connections_num": "connections_opened",
+    "connections_errors": "connection_errors",
+    "connections_lost": "connections_lost",
+    "returns_bad": "returned_bad",
+}
+
+
+def pool_of(alias):
+    connection = connections[alias]
+    return getattr(connection, "pool", None) if connection.vendor == "postgresql" else None
+
+
+def summarize(stats):
+    """Gauges and counters for one pool from ConnectionPool.get_stats()."""
+    summary = {
+        "min_size": stats.get("pool_min", 0),
+        "max_size": stats.get("pool_max", 0),
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+    }
+    summary.update({name: stats.get(counter, 0) for counter, name in POOL_COUNTERS.items()})
+    return summary
+
+
+def pool_metrics():
+    """{alias: metrics} for every configured database; pooled is False where there is no pool."""
+    metrics = {}
+    for alias in connections:
+        pool = pool_of(alias)
+        metrics[alias] = {"pooled": False} if pool is None else {"pooled": True, **summarize(pool.get_stats())}
+    return metrics
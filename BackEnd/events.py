@@ -0,0 +1,181 @@
+"""
+Live events for staff dashboards.
+
+Code that changes orders, payments or stock calls `publish()`; the event goes out once the
+surrounding transaction commits (immediately outside one), so listeners never hear about
+a change that was rolled back. Delivery is done by the backend named in EVENTS_BACKEND:
+
+- PostgresNotifyBackend (default on Postgres) sends events with NOTIFY on the default
+  database; every process with WebSocket clients LISTENs on one dedicated connection and
+  fans what arrives out to its own clients, so all workers see all events.
+- InProcessBackend (default elsewhere) fans events out to the WebSocket clients connected
+  to this process (see BackEnd.websocket) only, which is enough with a single worker.
+- LocalBackend just keeps what was published, for tests.
+
+Events are dicts: {"type": "order.status_changed", "data": {...}, "ts": "..."}. Order
+events carry change_seq, so a client that reconnects can catch up through the order
+change feed instead of refetching everything.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+PAYMENT_SETTLED = "payment.settled"
+STOCK_CHANGED = "stock.changed"
+
+
+def encode(event):
+    return json.dumps(event, cls=DjangoJSONEncoder)
+
+
+class InProcessBackend:
+    """Fans events out to asyncio queues registered by subscribers in this process."""
+
+    queue_size = 256
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            # publish() runs on worker threads; queues belong to the event loop
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    @staticmethod
+    def _offer(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping %s event for a subscriber that is not keeping up", event["type"])
+
+    async def subscribe(self):
+        """Async iterator of events published after the call."""
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+
+class PostgresNotifyBackend(InProcessBackend):
+    """
+    Delivers events to the subscribers of every process through Postgres LISTEN/NOTIFY.
+
+    Events published while a process's LISTEN connection is down are missed there;
+    clients catch up on orders through the change feed (change_seq).
+    """
+
+    channel = "karathi_events"
+    # NOTIFY payloads must stay under 8000 bytes
+    max_payload = 7900
+    reconnect_delay = 2
+
+    def __init__(self):
+        super().__init__()
+        self._listener_pid = None
+
+    def publish(self, event):
+        payload = encode(event)
+        if len(payload.encode()) > self.max_payload:
+            logger.warning("Dropping %s event: %d bytes is too large for NOTIFY", event["type"], len(payload))
+            return
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    async def subscribe(self):
+        with self._lock:
+            # Per pid: a forked worker does not inherit the listener thread
+            if self._listener_pid != os.getpid():
+                threading.Thread(target=self._listen, name="events-listener", daemon=True).start()
+                self._listener_pid = os.getpid()
+        async for event in super().subscribe():
+            yield event
+
+    def _listen(self):
+        import psycopg
+
+        params = connections[DEFAULT_DB_ALIAS].get_connection_params()
+        params.pop("cursor_factory", None)
+        while True:
+            try:
+                with psycopg.connect(**params, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {self.channel}")
+                    for notify in conn.notifies():
+                        InProcessBackend.publish(self, json.loads(notify.payload))
+            except Exception:
+                logger.exception("Events LISTEN connection failed; reconnecting")
+            time.sleep(self.reconnect_delay)
+
+
+class LocalBackend:
+    """Records published events in `.events` instead of delivering them."""
+
+    def __init__(self):
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+
+    async def subscribe(self):
+        for event in list(self.events):
+            yield event
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = settings.EVENTS_BACKEND or (
+                    "BackEnd.events.PostgresNotifyBackend"
+                    if connections[DEFAULT_DB_ALIAS].vendor == "postgresql"
+                    else "BackEnd.events.InProcessBackend"
+                )
+                _backend = import_string(name)()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "EVENTS_BACKEND":
+        _backend = None
+
+
+def publish(event_type, **data):
+    """Send an event to live subscribers once the current transaction commits."""
+    event = {"type": event_type, "data": data, "ts": timezone.now()}
+
+    def send():
+        try:
+            get_backend().publish(event)
+        except Exception:
+            logger.exception("Could not publish %s event", event_type)
+
+    transaction.on_commit(send)
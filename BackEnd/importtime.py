@@ -0,0 +1,65 @@
+"""
+Worker boot profiling with `python -X importtime`.
+
+`profile_boot()` starts a fresh interpreter that does what a worker does before its first
+request (load the WSGI application and the URLconf) and parses the import timings it
+reports on stderr. Used by the `profile_imports` command and the boot import test.
+"""
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+
+BOOT_SCRIPT = (
+    "import BackEnd.wsgi\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "import resource, sys\n"
+    "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    "print('\\n'.join(sys.modules))\n"
+)
+# Import time of a worker boot (see BOOT_SCRIPT); `profile_imports --check` enforces it.
+# Wall-clock time depends on the machine, so the unit tests leave it alone.
+STARTUP_BUDGET_MS = 1500
+# Only needed once a request uses them; importing them at boot is a regression
+DEFERRED_MODULES = ["PIL"]
+
+Import = namedtuple("Import", "module self_us cumulative_us depth")
+Boot = namedtuple("Boot", "imports modules max_rss_kb")
+
+
+def parse(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append(Import(name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def profile_boot():
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "BackEnd.settings")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    max_rss, *modules = result.stdout.split()
+    return Boot(parse(result.stderr), set(modules), int(max_rss))
+
+
+def total_ms(imports):
+    return sum(entry.self_us for entry in imports) / 1000
+
+
+def by_package(imports):
+    """{top-level package: (self ms, module count)}, slowest first."""
+    packages = {}
+    for entry in imports:
+        package = entry.module.split(".")[0]
+        spent, count = packages.get(package, (0, 0))
+        packages[package] = (spent + entry.self_us / 1000, count + 1)
+    return dict(sorted(packages.items(), key=lambda item: -item[1][0]))
@@ -0,0 +1,191 @@
+"""
+Structured logging.
+
+Every record is written as one JSON object carrying the id of the request (or job) it
+belongs to. RequestIDMiddleware takes the id from the proxy's X-Request-ID header or makes
+one up, keeps it in a context variable for the rest of the request and echoes it in the
+response; `request_context()` does the same for management commands and worker threads.
+
+Records are handed to the output handlers through a queue (QueueingHandler), so a slow
+disk or a blocked stdout pipe never holds up a request thread. The queue and its listener
+thread are created per process on first use, which keeps them working after gunicorn
+forks preloaded workers.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.utils.module_loading import import_string
+
+request_id = ContextVar("request_id", default="-")
+access_logger = logging.getLogger("BackEnd.access")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# LogRecord attributes that are not `extra=` fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def request_context(value=None):
+    """Tag the logs in this block (and contexts copied from it) with a request id."""
+    token = request_id.set(value or new_request_id())
+    try:
+        yield request_id.get()
+    finally:
+        request_id.reset(token)
+
+
+class SampleFilter(logging.Filter):
+    """Let through a `rate` fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate=0.01):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", request_id.get()),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a QueueListener that writes them to `handlers`.
+
+    `handlers` are handler specs ({"class": ..., **kwargs}); they are built, given the
+    JSON formatter, and started with the listener on the first record in each process.
+    A "{pid}" in a `filename` is replaced with the process id, so workers that rotate
+    files each rotate their own. A handler that cannot be created (say, a read-only log
+    directory) is reported on stderr and left out; with none left, records go to stderr.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.specs = handlers
+        self.queue_size = queue_size
+        self.listener = None
+        self.pid = None
+
+    def _build(self, spec):
+        kwargs = dict(spec)
+        cls = import_string(kwargs.pop("class"))
+        if "filename" in kwargs:
+            kwargs["filename"] = str(kwargs["filename"]).format(pid=os.getpid())
+            os.makedirs(os.path.dirname(kwargs["filename"]) or ".", exist_ok=True)
+        level = kwargs.pop("level", logging.NOTSET)
+        handler = cls(**kwargs)
+        handler.setLevel(level)
+        return handler
+
+    def _start(self):
+        targets = []
+        for spec in self.specs:
+            try:
+                targets.append(self._build(spec))
+            except Exception as exc:
+                # Logging must never take requests down with it
+                sys.stderr.write(f"Log handler {spec.get('class')} disabled: {exc!r}\n")
+        if not targets:
+            targets.append(logging.StreamHandler())
+        for handler in targets:
+            handler.setFormatter(JSONFormatter())
+        # A forked child inherits the parent's queue but not its listener thread
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        if self.pid is None:
+            atexit.register(self.stop)
+        self.pid = os.getpid()
+
+    def stop(self):
+        """Write out what is queued and stop the listener (no-op where it was not started)."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but the traceback stays a separate field for the JSON
+        # formatter and the request id is read here, on the thread that logged
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a log line beats blocking a request on log I/O
+            pass
+
+    def emit(self, record):
+        # handle() holds self.lock here, so only one thread starts the listener
+        if self.pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+
+class RequestIDMiddleware:
+    """Bind a request id for the request's logs, echo it back and log the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        current = incoming if VALID_REQUEST_ID.match(incoming) else new_request_id()
+        # Not reset on the way out: Django logs error responses (django.request) after the
+        # middleware chain has returned, and the next request on this thread sets its own
+        request_id.set(current)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        response[REQUEST_ID_HEADER] = current
+        access_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+        return response
@@ -0,0 +1,122 @@
+"""
+Production media serving.
+
+Content-hashed files (see BackEnd.storage) are sent with a one-year immutable
+Cache-Control and an ETag taken from the hash; legacy names get a short cache and an
+mtime/size ETag. Conditional GET (If-None-Match) and single byte ranges are supported.
+Whole-file responses use FileResponse so the server can hand them to sendfile().
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import file_hash
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+LEGACY_CACHE = "public, max-age=3600"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable range, None to ignore, False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None  # malformed or multi-range: fall back to the full file
+    start, end = match.groups()
+    if start and end and int(end) < int(start):
+        return None  # invalid, not unsatisfiable (RFC 9110 14.1.1): ignore the header
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return False
+        start, end = max(size - length, 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404("Not found")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Not found")
+
+    digest = file_hash(path)
+    etag = f'"{digest}"' if digest else f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE if digest else LEGACY_CACHE,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    byte_range = None
+    if "Range" in request.headers:
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range == etag:
+            byte_range = _parse_range(request.headers["Range"], stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+
+    for key, value in headers.items():
+        response[key] = value
+    return response
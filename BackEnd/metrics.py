@@ -0,0 +1,143 @@
+"""
+Prometheus metrics.
+
+MetricsMiddleware times every request (per route and status) and counts the queries it
+ran and the time they took. Payment gateways, stock reservation and the payment funnel
+are instrumented where they happen, through the metrics defined below.
+
+Under gunicorn every worker keeps its own values; with PROMETHEUS_MULTIPROC_DIR set (the
+gunicorn config does this) they write them to files in that directory, and /metrics
+aggregates the files of all workers, whichever worker serves the scrape. The endpoint is
+off unless METRICS_TOKEN is set, and then needs `Authorization: Bearer <token>`.
+"""
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to produce a response", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time per request spent in database queries", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+GATEWAY_LATENCY = Histogram(
+    "payment_gateway_request_seconds", "Payment gateway call latency", ["gateway", "operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+GATEWAY_ERRORS = Counter(
+    "payment_gateway_errors_total", "Failed payment gateway calls", ["gateway", "operation", "reason"],
+)
+STOCK_RESERVATION = Histogram(
+    "stock_reservation_seconds", "Conditional stock decrement time, including row lock waits",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+STOCK_SHORTAGES = Counter("stock_reservation_shortages_total", "Stock decrements refused for lack of stock")
+ORDER_CONFLICTS = Counter(
+    "order_transition_conflicts_total", "Order transitions lost to a concurrent change", ["target"],
+)
+# Stages: initiated, initiation_failed (the gateway refused the request), then the settled
+# status reported by the gateway: completed, failed or cancelled
+PAYMENTS = Counter("payments_total", "Payments by stage of the funnel", ["method", "stage"])
+
+
+class QueryStats:
+    """execute_wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        route = route_of(request)
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_LATENCY.labels(method, route, str(response.status_code)).observe(elapsed)
+        REQUEST_QUERIES.labels(route).observe(queries.count)
+        REQUEST_DB_TIME.labels(route).observe(queries.seconds)
+        return response
+
+
+class gateway_call:
+    """
+    Time one payment gateway call and count it as an error if it raises or gets an HTTP
+    error status:
+
+        with metrics.gateway_call("mpesa", "stk_push") as call:
+            response = call.track(requests.post(...))
+    """
+
+    def __init__(self, gateway, operation):
+        self.gateway = gateway
+        self.operation = operation
+        self.status = None
+
+    def track(self, response):
+        self.status = response.status_code
+        return response
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        GATEWAY_LATENCY.labels(self.gateway, self.operation).observe(time.perf_counter() - self.started)
+        if exc_type is not None:
+            GATEWAY_ERRORS.labels(self.gateway, self.operation, exc_type.__name__).inc()
+        elif self.status is not None and self.status >= 400:
+            GATEWAY_ERRORS.labels(self.gateway, self.operation, f"http_{self.status}").inc()
+        return False
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,95 @@
+"""
+Response compression.
+
+Like django.middleware.gzip.GZipMiddleware, but negotiates brotli (when the `brotli`
+package is installed) ahead of gzip, only compresses text-like content types above
+COMPRESSION_MIN_SIZE bytes, and leaves streaming responses alone: exports stream rows as
+they are read and media is sent with sendfile/range support, neither of which should be
+buffered through a compressor.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+ACCEPT_ENCODING_RE = _lazy_re_compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; codings with q=0 are left out."""
+    accepted = {}
+    for part in header.split(","):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted[match.group(1).lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    offered = (["br"] if brotli is not None else []) + ["gzip"]
+    candidates = [coding for coding in offered if coding in accepted or "*" in accepted]
+    if not candidates:
+        return None
+    # Highest q wins; ties go to the order above (brotli first)
+    return max(candidates, key=lambda coding: (accepted.get(coding, accepted.get("*")), -offered.index(coding)))
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5))
+    return gzip.compress(content, compresslevel=getattr(settings, "COMPRESSION_GZIP_LEVEL", 6), mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024):
+            return response
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The compressed body is not byte-identical to what the ETag was computed for
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,164 @@
+"""
+Sampled request profiling.
+
+ProfilingMiddleware profiles a PROFILE_SAMPLE_RATE fraction of requests, plus any request
+from an admin user that carries an X-Profile header. While a request is profiled, a
+background thread takes the stack of the thread handling it every PROFILE_INTERVAL_MS.
+This is wall-clock sampling, so time spent waiting on the database or a payment gateway
+shows up too. The stacks are appended in the collapsed ("folded") format read by
+flamegraph.pl and speedscope, one file per endpoint and process:
+PROFILE_DIR/<url name>.<pid>.folded. The `aggregate_profiles` command merges them.
+
+Requests that are not profiled pay for one header lookup (and one random() call when the
+rate is above zero). Nothing runs in the background until the first profiled request in
+a process.
+
+The header is checked before any sampling starts: its request's JWT is authenticated
+here, ahead of the view, and only an admin's request is profiled. Anyone else sending
+it costs one token check (and user lookup), as any authenticated request does.
+"""
+import functools
+import logging
+import os
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .metrics import route_of
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+UNSAFE_FILENAME = re.compile(r"[^\w.-]")
+STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+@functools.lru_cache(maxsize=4096)
+def label(code):
+    path = code.co_filename
+    if "site-packages" + os.sep in path:
+        path = path.rsplit("site-packages" + os.sep, 1)[1]
+    elif path.startswith(STDLIB):
+        path = path[len(STDLIB):]
+    elif path.startswith(str(settings.BASE_DIR)):
+        path = os.path.relpath(path, settings.BASE_DIR)
+    # ";" separates frames in the folded format
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse(frame, root):
+    """The stack from just below the `root` code object down to `frame`, root first."""
+    labels = []
+    while frame is not None and frame.f_code is not root:
+        labels.append(label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Samples the stacks of the threads that are being profiled, from a daemon thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.active = threading.Event()
+        self.pid = None
+
+    def start(self, thread_id, root):
+        with self.lock:
+            # A forked worker inherits this object but not the sampling thread
+            if self.pid != os.getpid():
+                self.profiles = {}
+                threading.Thread(target=self.run, name="request-profiler", daemon=True).start()
+                self.pid = os.getpid()
+            self.profiles[thread_id] = (Counter(), root)
+            self.active.set()
+
+    def stop(self, thread_id):
+        with self.lock:
+            stacks, _ = self.profiles.pop(thread_id)
+            if not self.profiles:
+                self.active.clear()
+        return stacks
+
+    def run(self):
+        while True:
+            self.active.wait()
+            time.sleep(settings.PROFILE_INTERVAL_MS / 1000)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, (stacks, root) in self.profiles.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame, root)] += 1
+
+
+sampler = Sampler()
+
+
+def is_admin(user):
+    # Same rule as the Admin app's IsAdminUser permission
+    return user is not None and user.is_authenticated and getattr(user, "user_type", None) == "admin"
+
+
+def token_user(request):
+    """The user of the request's JWT, or None when it has no valid one."""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def write_profile(route, stacks):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, f"{UNSAFE_FILENAME.sub('_', route)}.{os.getpid()}.folded")
+    with open(path, "a") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+    return path
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (sampled or (PROFILE_HEADER in request.META and is_admin(token_user(request)))):
+            return self.get_response(request)
+
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        sampler.start(thread_id, ProfilingMiddleware.__call__.__code__)
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop(thread_id)
+
+        if stacks:
+            route = route_of(request)
+            path = write_profile(route, stacks)
+            logger.info(
+                "Profiled %s: %s samples", route, stacks.total(),
+                extra={
+                    "route": route,
+                    "samples": stacks.total(),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "profile": path,
+                },
+            )
+        return response
@@ -0,0 +1,120 @@
+"""
+Read-replica routing.
+
+Replicas (DATABASE_REPLICA_URLS) only take reads that opted in: views using
+ReplicaReadMixin route the reads of a safe request to a random replica, everything else
+(writes, unsafe requests, code outside those views) keeps using `default`.
+
+Replication lags, so a user who just wrote something is pinned to `default` for
+REPLICA_PIN_SECONDS: ReplicaPinMiddleware records the write in the REPLICA_PIN_CACHE
+cache and the mixin checks it before switching. Checking a pin never touches a
+database. With several workers the cache has to be shared (REPLICA_PIN_REDIS_URL);
+the local-memory fallback only pins reads served by the worker that took the write.
+
+Replicas are never migrated. To try this locally, migrate a SQLite database, copy the
+file and point DATABASE_REPLICA_URLS at the copy.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+@contextmanager
+def replica_reads():
+    """Send reads in this block to a replica (when one is configured)."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def routed(queryset):
+    """
+    Fix the alias the router picks now, for a queryset that is only evaluated after the
+    view has returned (streaming responses).
+    """
+    return queryset.using(queryset.db)
+
+
+def _pin_key(user):
+    return f"replica-pin:{user.pk}"
+
+
+def pin(user):
+    caches[settings.REPLICA_PIN_CACHE].set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    if not user.is_authenticated:
+        return False
+    return caches[settings.REPLICA_PIN_CACHE].get(_pin_key(user), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replicas():
+            return random.choice(replicas())
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as default
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema (and data) by replicating default
+        return False if db in replicas() else None
+
+
+class ReplicaReadMixin:
+    """ViewSet mixin: safe requests read from a replica unless the user is pinned."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if replicas() and request.method in SAFE_METHODS and not is_pinned(request.user):
+            self._replica_token = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary for a few seconds after any successful write of theirs."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the authenticated (JWT) user onto the Django request
+        user = getattr(request, "user", None)
+        if (
+            replicas()
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin(user)
+        return response
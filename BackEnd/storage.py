@@ -0,0 +1,78 @@
+"""
+Content-hashed media storage.
+
+Uploads are saved as ``<stem>.<hash><ext>`` where the hash is taken from the file's
+bytes, so a media URL never changes meaning and can be cached forever. Saving the same
+content twice returns the existing file instead of writing a copy, even when both saves
+run at once.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(r"\.(?P<hash>[0-9a-f]{%d})\.[^./]+$" % HASH_LENGTH)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name, digest):
+    """products/Apple.jpg -> products/Apple.<digest>.jpg (an existing hash is replaced)."""
+    directory, filename = os.path.split(name)
+    match = HASHED_NAME_RE.search(filename)
+    if match:
+        filename = filename[:match.start()] + filename[match.end("hash"):]
+    stem, ext = os.path.splitext(filename)
+    return os.path.join(directory, f"{stem}.{digest}{ext}")
+
+
+def file_hash(name):
+    """The content hash embedded in a stored name, or None for legacy names."""
+    match = HASHED_NAME_RE.search(name)
+    return match.group("hash") if match else None
+
+
+class HashedMediaStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            from django.core.files import File
+            content = File(content, name)
+
+        name = hashed_name(self.generate_filename(name), content_hash(content))
+        if self.exists(name):
+            # Same bytes are already stored under this name
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # A hashed name is only ever taken by the same bytes, so it never needs a suffix
+        if file_hash(name) and (max_length is None or len(name) <= max_length):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not file_hash(name):
+            return super()._save(name, content)
+        # Written aside and moved into place: the hashed name never shows a partial file,
+        # and a concurrent save of the same bytes just replaces it with identical content
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        try:
+            os.replace(self.path(partial), self.path(name))
+        except OSError:
+            self.delete(partial)
+            raise
+        return name
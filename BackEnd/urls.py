@@ -1,8 +1,11 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from .media import serve_media
+from .metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,8 +13,11 @@ urlpatterns = [
     path("api/auth/", include("Auth.urls")),
     path("api/payment/", include("Payment.urls")),
     path("api/shop/", include("Shop.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
-# Serve media files in development
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media: content-hashed names with long-lived caching (see BackEnd/media.py)
+urlpatterns += [
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name="media"),
+]
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,131 @@
+"""
+WebSocket endpoint for staff dashboards: ws(s)://<host>/ws/staff/events/
+
+Plain ASGI, mounted next to the Django app in BackEnd.asgi, so it needs an ASGI server
+(uvicorn workers under gunicorn). Every event published through BackEnd.events is
+forwarded as one JSON text frame.
+
+The JWT access token never goes in the URL (where proxies and access logs keep it). A
+client either offers it as subprotocols, `Sec-WebSocket-Protocol: bearer, <token>`
+(browsers: `new WebSocket(url, ["bearer", token])`), and is refused before the handshake
+completes if it is not a staff token; or connects without one and sends {"token": ...}
+as its first frame within AUTH_TIMEOUT seconds. The socket is closed with 4401 when the
+token expires; sending {"token": ...} with a fresh token of the same user before then
+keeps it open. Other frames are ignored.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+
+from .events import encode, get_backend
+
+STAFF_EVENTS_PATH = "/ws/staff/events/"
+AUTH_PROTOCOL = "bearer"
+AUTH_TIMEOUT = 10
+
+REFUSED = 4403
+EXPIRED = 4401
+
+
+@sync_to_async
+def _authenticate(token):
+    """(staff user, expiry timestamp) for an access token, or None."""
+    from django.db import close_old_connections
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+    from Shop.views import is_admin_or_staff
+
+    close_old_connections()
+    try:
+        auth = JWTAuthentication()
+        validated = auth.get_validated_token(token)
+        user = auth.get_user(validated)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    finally:
+        close_old_connections()
+    return (user, validated["exp"]) if is_admin_or_staff(user) else None
+
+
+def _protocol_token(scope):
+    protocols = scope.get("subprotocols") or []
+    if len(protocols) == 2 and protocols[0] == AUTH_PROTOCOL:
+        return protocols[1]
+    return None
+
+
+def _message_token(message):
+    """The token of a {"token": ...} text frame, or None."""
+    try:
+        data = json.loads(message.get("text") or "")
+    except ValueError:
+        return None
+    token = data.get("token") if isinstance(data, dict) else None
+    return token if isinstance(token, str) and token else None
+
+
+async def websocket_application(scope, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+    if scope["path"] != STAFF_EVENTS_PATH:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    token = _protocol_token(scope)
+    if token is not None:
+        session = await _authenticate(token)
+        if session is None:
+            await send({"type": "websocket.close", "code": REFUSED})
+            return
+        await send({"type": "websocket.accept", "subprotocol": AUTH_PROTOCOL})
+    else:
+        await send({"type": "websocket.accept"})
+        try:
+            message = await asyncio.wait_for(receive(), AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            message = {"type": "websocket.receive"}
+        if message["type"] == "websocket.disconnect":
+            return
+        token = _message_token(message)
+        session = await _authenticate(token) if token else None
+        if session is None:
+            await send({"type": "websocket.close", "code": REFUSED})
+            return
+
+    user, expires = session
+
+    async def forward():
+        async for event in get_backend().subscribe():
+            await send({"type": "websocket.send", "text": encode(event)})
+
+    async def listen():
+        nonlocal expires
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            token = _message_token(message)
+            if token is None:
+                continue
+            renewed = await _authenticate(token)
+            if renewed is None or renewed[0].pk != user.pk:
+                await send({"type": "websocket.close", "code": REFUSED})
+                return
+            expires = renewed[1]
+
+    async def expire():
+        # Re-checked on waking, as a renewed token moves the deadline
+        while (remaining := expires - time.time()) > 0:
+            await asyncio.sleep(remaining)
+        await send({"type": "websocket.close", "code": EXPIRED})
+
+    tasks = [asyncio.ensure_future(task()) for task in (forward, listen, expire)]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        task.result()
@@ -11,8 +11,9 @@ class PaymentAdmin(admin.ModelAdmin):
         "amount",
         "status",
         "transaction_id",   # ✅ use this instead of mpesa_receipt_number
+        "receipt_number",
         "created_at",       # ✅ keep created_at instead of transaction_date
     )
     list_filter = ("status", "payment_method", "created_at")  # ✅ no transaction_date
-    search_fields = ("order__id", "user__username", "phone_number", "transaction_id")
+    search_fields = ("order__id", "user__username", "phone_number", "transaction_id", "receipt_number")
     ordering = ("-created_at",)
@@ -5,6 +5,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Payment
 from .serializers import PaymentSerializer
+from .services.reconciliation import STATUS_ALIASES, reconcile_payments
+
+MAX_RECONCILE_ITEMS = 10000
 
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
@@ -45,24 +48,34 @@ def reconcile_payment(request, payment_id):
     Manually mark a payment as Success/Failed and update related order.
     Useful if callback failed.
     """
-    try:
-        payment = Payment.objects.get(id=payment_id)
-    except Payment.DoesNotExist:
-        return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
-
     new_status = request.data.get("status")
-    if new_status not in ["Success", "Failed"]:
+    if str(new_status).lower() not in STATUS_ALIASES:
         return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
 
-    payment.status = new_status
-    payment.save()
+    summary, results = reconcile_payments(
+        [{"payment_id": payment_id, "status": new_status}], request.user
+    )
+    if results[0]["result"] == "not_found":
+        return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({"message": f"Payment {payment_id} updated to {results[0]['status']}."})
+
 
-    # NOTE: It's good practice to ensure 'Success'/'Failed' match case if model choices are strict
-    if new_status == "Success":
-        payment.order.status = "Processing"
-        payment.order.save()
-    elif new_status == "Failed":
-        payment.order.status = "Pending Payment"
-        payment.order.save()
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def bulk_reconcile_payments(request):
+    """
+    Reconcile many payments at once.
+    Body: {"items": [{"payment_id": 1, "status": "completed"}, {"receipt": "QK12ABC", "status": "failed"}, ...]}
+    """
+    items = request.data.get("items")
+    if not isinstance(items, list) or not items:
+        return Response({"error": "items must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_RECONCILE_ITEMS:
+        return Response(
+            {"error": f"At most {MAX_RECONCILE_ITEMS} items per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    return Response({"message": f"Payment {payment_id} updated to {new_status}."})
\ No newline at end of file
+    summary, results = reconcile_payments(items, request.user)
+    return Response({"summary": summary, "results": results})
@@ -0,0 +1,44 @@
+# payment/management/commands/poll_payment_status.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from BackEnd.logs import request_context
+from Payment.services.status_poller import poll_pending_payments
+
+
+class Command(BaseCommand):
+    help = "Query M-Pesa / Airtel for stale pending payments and settle them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=2, help="Minutes a payment must have been pending"
+        )
+        parser.add_argument(
+            "--limit", type=int, default=500, help="Maximum payments to check per batch"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Maximum concurrent provider requests"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=0, help="Seconds between batches (0 = run once)"
+        )
+
+    def handle(self, *args, **options):
+        older_than = timedelta(minutes=options["older_than"])
+
+        while True:
+            with request_context():
+                result = poll_pending_payments(
+                    older_than=older_than,
+                    limit=options["limit"],
+                    max_workers=options["workers"],
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {result['checked']} payment(s), settled {result['settled']}."
+            ))
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
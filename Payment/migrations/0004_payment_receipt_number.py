@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-19 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_receipts(apps, schema_editor):
+    """Settlement used to overwrite transaction_id with the provider's receipt."""
+    Payment = apps.get_model("Payment", "Payment")
+    settled = Payment.objects.exclude(status="pending").exclude(transaction_id__isnull=True)
+    for payment in settled.filter(payment_method="mpesa").only("id", "transaction_id"):
+        # M-Pesa is looked up by checkout_request_id; transaction_id only ever held the receipt
+        payment.receipt_number, payment.transaction_id = payment.transaction_id, None
+        payment.save(update_fields=["receipt_number", "transaction_id"])
+    for payment in settled.filter(payment_method="airtel").exclude(transaction_id__startswith="TXN-").only(
+        "id", "transaction_id"
+    ):
+        # Restore the id the payment was initiated (and its callbacks are sent) with
+        payment.receipt_number, payment.transaction_id = payment.transaction_id, f"TXN-{payment.id}"
+        payment.save(update_fields=["receipt_number", "transaction_id"])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Payment', '0003_payment_provider_reference_indexes'),
+        ('Shop', '0015_catalog_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='receipt_number',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['receipt_number'], name='payment_receipt_idx'),
+        ),
+        migrations.RunPython(move_receipts, migrations.RunPython.noop),
+    ]
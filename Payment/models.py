@@ -22,8 +22,11 @@ class Payment(models.Model):
     phone_number = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     
-    # Transaction details
+    # Transaction details. transaction_id is our reference with the provider (the Airtel
+    # transaction id we send); receipt_number is what the provider reports on settlement
+    # (M-Pesa receipt number, Airtel money id)
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    receipt_number = models.CharField(max_length=100, blank=True, null=True)
     merchant_request_id = models.CharField(max_length=100, blank=True, null=True)
     checkout_request_id = models.CharField(max_length=100, blank=True, null=True)
     
@@ -35,6 +38,18 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Callback and reconciliation lookups by provider reference
+            models.Index(fields=['checkout_request_id'], name='payment_checkout_req_idx'),
+            models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+            models.Index(fields=['receipt_number'], name='payment_receipt_idx'),
+            # Status poller scans only the (small) set of stale pending payments
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(status='pending'),
+                name='payment_pending_updated_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.payment_method} - {self.phone_number} - {self.amount}"
@@ -1,6 +1,7 @@
-import requests
 from django.conf import settings
 
+from BackEnd import metrics
+
 
 class AirtelMoneyService:
     def __init__(self):
@@ -15,6 +16,8 @@ class AirtelMoneyService:
     
     def get_access_token(self):
         """Get OAuth access token"""
+        import requests
+
         url = f"{self.base_url}/auth/oauth2/token"
         
         headers = {
@@ -28,13 +31,16 @@ class AirtelMoneyService:
             "grant_type": "client_credentials"
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        with metrics.gateway_call("airtel", "token") as call:
+            response = call.track(requests.post(url, json=payload, headers=headers))
         response.raise_for_status()
         
         return response.json()['access_token']
     
     def initiate_payment(self, phone_number, amount, reference, transaction_id):
         """Initiate Airtel Money payment"""
+        import requests
+
         access_token = self.get_access_token()
         
         # Format phone number for Airtel (country code without +)
@@ -67,5 +73,25 @@ class AirtelMoneyService:
             }
         }
         
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json()
\ No newline at end of file
+        with metrics.gateway_call("airtel", "initiate_payment") as call:
+            response = call.track(requests.post(url, json=payload, headers=headers))
+        return response.json()
+
+    def check_transaction_status(self, transaction_id, access_token=None):
+        """Enquire the status of an Airtel Money transaction"""
+        import requests
+
+        access_token = access_token or self.get_access_token()
+
+        url = f"{self.base_url}/standard/v1/payments/{transaction_id}"
+
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Accept': '*/*',
+            'X-Country': 'KE',
+            'X-Currency': 'KES'
+        }
+
+        with metrics.gateway_call("airtel", "transaction_status") as call:
+            response = call.track(requests.get(url, headers=headers, timeout=30))
+        return response.json()
@@ -1,8 +1,21 @@
-import requests
 import base64
+import logging
 from datetime import datetime
 from django.conf import settings
 
+from BackEnd import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def redacted(payload):
+    """STK payload safe to log: no password, phone numbers masked."""
+    masked = {**payload, "Password": "***"}
+    for key in ("PartyA", "PhoneNumber"):
+        if masked.get(key):
+            masked[key] = str(masked[key])[:5] + "****" + str(masked[key])[-2:]
+    return masked
+
 
 class MPesaService:
     def __init__(self):
@@ -19,6 +32,8 @@ class MPesaService:
     
     def get_access_token(self):
         """Get OAuth access token"""
+        import requests
+
         url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
         
         auth_string = f"{self.consumer_key}:{self.consumer_secret}"
@@ -29,7 +44,8 @@ class MPesaService:
             'Authorization': f'Basic {auth_base64}'
         }
         
-        response = requests.get(url, headers=headers)
+        with metrics.gateway_call("mpesa", "token") as call:
+            response = call.track(requests.get(url, headers=headers))
         response.raise_for_status()
         
         return response.json()['access_token']
@@ -43,6 +59,8 @@ class MPesaService:
     
     def stk_push(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK Push"""
+        import requests
+
         access_token = self.get_access_token()
         password, timestamp = self.generate_password()
         
@@ -59,8 +77,6 @@ class MPesaService:
             'Content-Type': 'application/json'
         }
 
-        print(f"Callback URL being sent: {self.callback_url}")
-        
         payload = {
             "BusinessShortCode": self.shortcode,
             "Password": password,
@@ -75,7 +91,39 @@ class MPesaService:
             "TransactionDesc": transaction_desc
         }
         
-        print(f"Full payload: {payload}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("STK push request", extra={"url": url, "payload": redacted(payload)})
+
+        with metrics.gateway_call("mpesa", "stk_push") as call:
+            response = call.track(requests.post(url, json=payload, headers=headers))
+        result = response.json()
+        logger.info(
+            "STK push for %s answered %s", account_reference, result.get("ResponseCode", response.status_code),
+            extra={"checkout_request_id": result.get("CheckoutRequestID")},
+        )
+        return result
+
+    def stk_query(self, checkout_request_id, access_token=None):
+        """Query the status of an STK Push transaction"""
+        import requests
+
+        access_token = access_token or self.get_access_token()
+        password, timestamp = self.generate_password()
+
+        url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
+
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
+
+        payload = {
+            "BusinessShortCode": self.shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id
+        }
 
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json()
\ No newline at end of file
+        with metrics.gateway_call("mpesa", "stk_query") as call:
+            response = call.track(requests.post(url, json=payload, headers=headers, timeout=30))
+        return response.json()
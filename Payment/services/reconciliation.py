@@ -0,0 +1,170 @@
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+
+from Payment.models import Payment
+from Shop import audit
+from Shop.models import AuditLog
+from Shop.state_machine import transition_many
+
+
+# Accepts the model values plus the legacy labels used by the reconcile endpoint
+STATUS_ALIASES = {
+    "pending": "pending",
+    "completed": "completed",
+    "success": "completed",
+    "failed": "failed",
+    "cancelled": "cancelled",
+}
+
+# payment status -> (new order status, order statuses it may move from)
+ORDER_STATUS_FOR_PAYMENT = {
+    "completed": ("paid", ["pending"]),
+    "failed": ("pending", ["paid"]),
+    "cancelled": ("pending", ["paid"]),
+}
+
+CHUNK_SIZE = 500
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _normalise(items):
+    """Split raw request items into resolvable entries and per-item errors."""
+    entries, results = [], []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        payment_id = item.get("payment_id")
+        receipt = item.get("receipt")
+        status = STATUS_ALIASES.get(str(item.get("status", "")).strip().lower())
+        result = {"index": index, "payment_id": payment_id, "receipt": receipt}
+
+        if payment_id is not None:
+            try:
+                payment_id = result["payment_id"] = int(payment_id)
+            except (TypeError, ValueError):
+                results.append({**result, "result": "invalid_reference"})
+                continue
+
+        if status is None:
+            results.append({**result, "result": "invalid_status"})
+        elif payment_id is None and not receipt:
+            results.append({**result, "result": "invalid_reference"})
+        else:
+            entries.append({**result, "status": status})
+    return entries, results
+
+
+def _lock_payments(entries):
+    """
+    Resolve entry references to payment rows, locking them (in id order) for the rest of
+    the transaction. Returns ({id: row}, {receipt: row}).
+    """
+    payment_ids = {e["payment_id"] for e in entries if e["payment_id"] is not None}
+    receipts = {e["receipt"] for e in entries if e["payment_id"] is None}
+    fields = ("id", "order_id", "status", "transaction_id", "receipt_number")
+    by_id, by_receipt = {}, {}
+    for chunk in _chunks(payment_ids):
+        for row in Payment.objects.select_for_update().filter(id__in=chunk).order_by("id").values(*fields):
+            by_id[row["id"]] = row
+    for chunk in _chunks(receipts):
+        # Older payments kept the provider receipt in transaction_id
+        rows = Payment.objects.select_for_update().filter(
+            Q(receipt_number__in=chunk) | Q(transaction_id__in=chunk)
+        ).order_by("id")
+        for row in rows.values(*fields):
+            for reference in (row["transaction_id"], row["receipt_number"]):
+                if reference in receipts:
+                    by_receipt[reference] = row
+    return by_id, by_receipt
+
+
+def reconcile_payments(items, user):
+    """
+    Reconcile many payments (by id or provider receipt) in a few set-based UPDATEs.
+
+    The payments are locked while they are read, so the status an entry is compared with
+    (and audited as the old one) is the one it replaces, even with callbacks settling
+    payments at the same time. Payments are grouped by target status and updated one
+    statement per chunk; the related orders follow ORDER_STATUS_FOR_PAYMENT. Everything
+    runs in one transaction and one audit entry per changed payment is bulk-inserted.
+    A payment named more than once with different statuses is left alone ("conflict").
+    Returns (summary, per-item results).
+    """
+    entries, results = _normalise(items)
+
+    now = timezone.now()
+    with audit.atomic():
+        by_id, by_receipt = _lock_payments(entries)
+
+        resolved = defaultdict(list)  # payment id -> entries naming it
+        rows = {}
+        for entry in entries:
+            row = by_id.get(entry["payment_id"]) if entry["payment_id"] is not None else by_receipt.get(entry["receipt"])
+            if row is None:
+                results.append({**entry, "result": "not_found"})
+                continue
+            entry["payment_id"] = row["id"]
+            resolved[row["id"]].append(entry)
+            rows[row["id"]] = row
+
+        targets = {}  # payment id -> (row, new status)
+        for payment_id, named in resolved.items():
+            row = rows[payment_id]
+            statuses = {entry["status"] for entry in named}
+            if len(statuses) > 1:
+                results.extend({**entry, "result": "conflict"} for entry in named)
+                continue
+            new_status = statuses.pop()
+            changed = row["status"] != new_status
+            if changed:
+                targets[payment_id] = (row, new_status)
+            # Repeats of the same instruction only count once
+            results.extend(
+                {**entry, "result": "updated" if changed and i == 0 else "unchanged"}
+                for i, entry in enumerate(named)
+            )
+
+        audit_entries = []
+        for new_status in dict.fromkeys(STATUS_ALIASES.values()):
+            ids = [pid for pid, (_, status) in targets.items() if status == new_status]
+            if not ids:
+                continue
+            for chunk in _chunks(ids):
+                Payment.objects.filter(id__in=chunk).update(
+                    status=new_status, result_desc="Manually reconciled", updated_at=now
+                )
+
+            order_status = ORDER_STATUS_FOR_PAYMENT.get(new_status)
+            if order_status is not None:
+                order_ids = {targets[pid][0]["order_id"] for pid in ids}
+                for chunk in _chunks(order_ids):
+                    transition_many(chunk, order_status[0], user=user, sources=order_status[1])
+
+            audit_entries.extend(
+                AuditLog(
+                    user=user,
+                    order_id=targets[pid][0]["order_id"],
+                    action_type="payment_reconcile",
+                    old_status=targets[pid][0]["status"],
+                    new_status=new_status,
+                    payload={"payment_id": pid},
+                    description=(
+                        f"Payment #{pid} reconciled from '{targets[pid][0]['status']}' to '{new_status}'. "
+                        f"Handled by: {user.username} (ID: {user.id})."
+                    ),
+                )
+                for pid in ids
+            )
+        audit.record_many(audit_entries)
+
+    results.sort(key=lambda r: r["index"])
+    summary = {"total": len(results)}
+    for result in results:
+        summary[result["result"]] = summary.get(result["result"], 0) + 1
+    return summary, results
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from BackEnd import events, metrics
+from Payment.models import Payment
+from Shop.state_machine import transition_many
+
+
+PaymentOutcome = namedtuple(
+    "PaymentOutcome", ["payment_id", "status", "receipt_number", "result_desc"]
+)
+
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# STK result code for a customer dismissing the prompt
+MPESA_CANCELLED_CODES = {"1032"}
+
+# Airtel: TS = success, TF = failed. TIP (in progress) and TA (ambiguous) stay pending.
+AIRTEL_STATUS_MAP = {"TS": "completed", "TF": "failed"}
+
+
+def mpesa_outcome(payment_id, result):
+    """Translate an STK query response into a PaymentOutcome (None while still processing)"""
+    if "errorCode" in result or result.get("ResultCode") is None:
+        return None
+
+    code = str(result["ResultCode"])
+    if code == "0":
+        status = "completed"
+    elif code in MPESA_CANCELLED_CODES:
+        status = "cancelled"
+    else:
+        status = "failed"
+    return PaymentOutcome(payment_id, status, None, result.get("ResultDesc"))
+
+
+def airtel_outcome(payment_id, transaction_data):
+    """Translate an Airtel transaction (enquiry or callback) into a PaymentOutcome"""
+    code = transaction_data.get("status") or transaction_data.get("status_code")
+    status = AIRTEL_STATUS_MAP.get(code)
+    if status is None:
+        return None
+    return PaymentOutcome(
+        payment_id,
+        status,
+        transaction_data.get("airtel_money_id"),
+        transaction_data.get("message"),
+    )
+
+
+def settle_payments(outcomes):
+    """
+    Apply provider results to payments in bulk.
+
+    Only payments that are still pending are touched, so duplicate callbacks and
+    overlapping poller runs are harmless. Orders of completed payments move from
+    'pending' to 'paid'. Returns the number of payments settled.
+    """
+    outcomes = {o.payment_id: o for o in outcomes if o and o.status in FINAL_STATUSES}
+    if not outcomes:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=list(outcomes), status="pending")
+            .only("id", "order_id", "payment_method", "status", "receipt_number", "result_desc", "updated_at")
+        )
+        for payment in payments:
+            outcome = outcomes[payment.id]
+            payment.status = outcome.status
+            payment.receipt_number = outcome.receipt_number or payment.receipt_number
+            payment.result_desc = outcome.result_desc or payment.result_desc
+            payment.updated_at = now
+
+        Payment.objects.bulk_update(
+            payments, ["status", "receipt_number", "result_desc", "updated_at"]
+        )
+        for payment in payments:
+            events.publish(
+                events.PAYMENT_SETTLED, payment_id=payment.id, order_id=payment.order_id, status=payment.status
+            )
+
+        paid_order_ids = [p.order_id for p in payments if p.status == "completed"]
+        if paid_order_ids:
+            transition_many(paid_order_ids, "paid", sources=["pending"])
+
+    for payment in payments:
+        metrics.PAYMENTS.labels(payment.payment_method, payment.status).inc()
+    return len(payments)
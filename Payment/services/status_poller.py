@@ -0,0 +1,70 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from Payment.models import Payment
+from .airtel_service import AirtelMoneyService
+from .mpesa_service import MPesaService
+from .settlement import airtel_outcome, mpesa_outcome, settle_payments
+
+logger = logging.getLogger(__name__)
+
+
+def stale_pending_payments(older_than, limit):
+    """Pending payments with a provider reference that have not moved for `older_than`."""
+    cutoff = timezone.now() - older_than
+    return list(
+        Payment.objects.filter(status="pending", updated_at__lt=cutoff)
+        .filter(
+            Q(payment_method="mpesa", checkout_request_id__isnull=False)
+            | Q(payment_method="airtel", transaction_id__isnull=False)
+        )
+        .only("id", "payment_method", "checkout_request_id", "transaction_id", "updated_at")
+        .order_by("updated_at")[:limit]
+    )
+
+
+def poll_pending_payments(older_than=timedelta(minutes=2), limit=500, max_workers=8):
+    """
+    Ask M-Pesa / Airtel for the status of stale pending payments and settle the results.
+
+    Provider calls run concurrently (at most `max_workers` in flight); the database is
+    only touched once to read the batch and once to settle it.
+    """
+    payments = stale_pending_payments(older_than, limit)
+    if not payments:
+        return {"checked": 0, "settled": 0}
+
+    services = {"mpesa": MPesaService(), "airtel": AirtelMoneyService()}
+    tokens = {}
+    # One OAuth token per provider for the whole batch
+    for method in {p.payment_method for p in payments}:
+        try:
+            tokens[method] = services[method].get_access_token()
+        except Exception:
+            logger.exception("Could not get %s access token; skipping its payments", method)
+
+    def enquire(payment):
+        token = tokens.get(payment.payment_method)
+        if token is None:
+            return None
+        try:
+            if payment.payment_method == "mpesa":
+                result = services["mpesa"].stk_query(payment.checkout_request_id, access_token=token)
+                return mpesa_outcome(payment.id, result)
+            result = services["airtel"].check_transaction_status(payment.transaction_id, access_token=token)
+            return airtel_outcome(payment.id, result.get("data", {}).get("transaction", {}))
+        except Exception:
+            logger.exception("Status enquiry failed for payment %s", payment.id)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Each call runs in a copy of this context so its logs keep the caller's request id
+        futures = [pool.submit(contextvars.copy_context().run, enquire, payment) for payment in payments]
+        outcomes = [outcome for outcome in (future.result() for future in futures) if outcome]
+
+    return {"checked": len(payments), "settled": settle_payments(outcomes)}
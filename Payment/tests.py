@@ -1,3 +1,215 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Auth.models import CustomUser
+from BackEnd import metrics
+from Shop.models import AuditLog, Order, Product, ProductVariant
+from .models import Payment
+from .services.mpesa_service import redacted
+from .services.reconciliation import reconcile_payments
+from .services.status_poller import poll_pending_payments, stale_pending_payments
+
+
+class MPesaLoggingTests(TestCase):
+    def test_logged_payload_hides_credentials_and_phone_numbers(self):
+        payload = {"Password": "c2VjcmV0", "PartyA": "254712345678", "PhoneNumber": "254712345678", "Amount": 10}
+        logged = redacted(payload)
+        self.assertEqual(logged["Password"], "***")
+        self.assertEqual(logged["PhoneNumber"], "25471****78")
+        self.assertEqual(logged["Amount"], 10)
+        self.assertEqual(payload["Password"], "c2VjcmV0")
+
+
+@mock.patch("Payment.views.AirtelMoneyService.check_transaction_status")
+class AirtelCallbackTests(TestCase):
+    def setUp(self):
+        self.user = user = CustomUser.objects.create_user("c@example.com", "c", "C", "Ustomer", "pw")
+        self.order = Order.objects.create(user=user, status="pending", total_price=100)
+        self.payment = Payment.objects.create(
+            order=self.order, user=user, payment_method="airtel", phone_number="0712345678", amount=100
+        )
+        self.payment.transaction_id = f"TXN-{self.payment.id}"
+        self.payment.save()
+
+    def callback(self, status_code):
+        transaction = {"id": self.payment.transaction_id, "status_code": status_code, "airtel_money_id": "MP1"}
+        return self.client.post("/api/payment/airtel/callback/", {"transaction": transaction}, content_type="application/json")
+
+    def enquiry(self, status):
+        return {"data": {"transaction": {"id": self.payment.transaction_id, "status": status, "airtel_money_id": "MP1"}}}
+
+    def test_forged_success_is_settled_with_the_enquired_status(self, check_status):
+        check_status.return_value = self.enquiry("TIP")
+        self.assertEqual(self.callback("TS").status_code, 200)
+        check_status.assert_called_once_with(self.payment.transaction_id)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, "pending")
+
+    def test_duplicate_callback_finds_the_settled_payment(self, check_status):
+        check_status.return_value = self.enquiry("TS")
+        self.callback("TS")
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.receipt_number), ("completed", "MP1"))
+        self.assertEqual(self.payment.transaction_id, f"TXN-{self.payment.id}")
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, "paid")
+
+        self.assertEqual(self.callback("TS").status_code, 200)
+        check_status.assert_called_once()
+
+    def test_gateway_failures_and_refused_requests_are_counted_apart(self, check_status):
+        failed = metrics.PAYMENTS.labels("airtel", "failed")
+        refused = metrics.PAYMENTS.labels("airtel", "initiation_failed")
+        before = (failed._value.get(), refused._value.get())
+
+        check_status.return_value = self.enquiry("TF")
+        self.callback("TF")
+        variant = ProductVariant.objects.create(
+            product=Product.objects.create(name="Royal Palm", category="palms"), size="5L", price=500, stock=3
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch("Payment.views.AirtelMoneyService.initiate_payment", return_value={"status": {"success": False}}):
+            response = client.post(
+                "/api/payment/initiate/",
+                {"payment_method": "airtel", "phone_number": "0712345678", "cart_items": [{"variant_id": variant.id, "quantity": 1}]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((failed._value.get(), refused._value.get()), (before[0] + 1, before[1] + 1))
+
+    def test_in_progress_and_ambiguous_callbacks_stay_pending(self, check_status):
+        for status_code in ("TIP", "TA"):
+            self.assertEqual(self.callback(status_code).status_code, 200)
+        check_status.assert_not_called()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+
+
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("a@example.com", "a", "A", "Dmin", "pw")
+        user = CustomUser.objects.create_user("c@example.com", "c", "C", "Ustomer", "pw")
+        self.payments = []
+        for receipt in ("MP1", "MP2"):
+            order = Order.objects.create(user=user, status="pending", total_price=100)
+            self.payments.append(Payment.objects.create(
+                order=order, user=user, payment_method="mpesa", phone_number="0712345678",
+                amount=100, receipt_number=receipt,
+            ))
+
+    def test_updates_payments_orders_and_audit(self):
+        first, second = self.payments
+        with self.captureOnCommitCallbacks(execute=True):
+            summary, results = reconcile_payments(
+                [{"payment_id": first.id, "status": "success"}, {"receipt": "MP2", "status": "failed"},
+                 {"payment_id": first.id, "status": "completed"}, {"receipt": "NOPE", "status": "failed"}],
+                self.admin,
+            )
+        self.assertEqual([r["result"] for r in results], ["updated", "updated", "unchanged", "not_found"])
+        self.assertEqual(summary, {"total": 4, "updated": 2, "unchanged": 1, "not_found": 1})
+        self.assertEqual(Payment.objects.get(pk=first.pk).status, "completed")
+        self.assertEqual(Order.objects.get(pk=first.order_id).status, "paid")
+        self.assertEqual(Payment.objects.get(pk=second.pk).status, "failed")
+        logged = AuditLog.objects.filter(action_type="payment_reconcile").order_by("order_id")
+        self.assertEqual([(a.old_status, a.new_status) for a in logged], [("pending", "completed"), ("pending", "failed")])
+
+    def test_conflicting_duplicates_are_left_alone(self):
+        first, _ = self.payments
+        with self.captureOnCommitCallbacks(execute=True):
+            summary, results = reconcile_payments(
+                [{"payment_id": first.id, "status": "completed"}, {"receipt": "MP1", "status": "failed"}],
+                self.admin,
+            )
+        self.assertEqual([r["result"] for r in results], ["conflict", "conflict"])
+        self.assertEqual(summary, {"total": 2, "conflict": 2})
+        self.assertEqual(Payment.objects.get(pk=first.pk).status, "pending")
+        self.assertFalse(AuditLog.objects.filter(action_type="payment_reconcile").exists())
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_rows_are_locked_while_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            reconcile_payments([{"payment_id": self.payments[0].id, "status": "completed"}], self.admin)
+        reads = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and '"Payment_payment"' in q["sql"]]
+        self.assertIn("FOR UPDATE", reads[0])
+
+
+@mock.patch("Payment.services.status_poller.AirtelMoneyService.get_access_token", return_value="airtel-token")
+@mock.patch("Payment.services.status_poller.MPesaService.get_access_token", return_value="mpesa-token")
+class StatusPollerTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("c@example.com", "c", "C", "Ustomer", "pw")
+
+    def payment(self, method, reference, status="pending", minutes_ago=10):
+        order = Order.objects.create(user=self.user, status="pending", total_price=100)
+        payment = Payment.objects.create(
+            order=order, user=self.user, payment_method=method, phone_number="0712345678",
+            amount=100, status=status,
+            **({"checkout_request_id": reference} if method == "mpesa" else {"transaction_id": reference}),
+        )
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(minutes=minutes_ago))
+        return payment
+
+    def stk_results(self, checkout_request_id, access_token=None):
+        return {
+            "ws_CO_PAID": {"ResultCode": "0", "ResultDesc": "Processed"},
+            "ws_CO_CANCELLED": {"ResultCode": "1032", "ResultDesc": "Cancelled by user"},
+            "ws_CO_WAITING": {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"},
+        }[checkout_request_id]
+
+    def airtel_results(self, transaction_id, access_token=None):
+        if transaction_id == "TXN-DOWN":
+            raise ConnectionError("gateway timeout")
+        status = {"TXN-FAILED": "TF", "TXN-WAITING": "TIP"}[transaction_id]
+        return {"data": {"transaction": {"id": transaction_id, "status": status, "message": "Declined"}}}
+
+    def test_only_stale_pending_payments_with_a_reference_are_picked(self, mpesa_token, airtel_token):
+        stale = self.payment("mpesa", "ws_CO_PAID")
+        self.payment("mpesa", "ws_CO_FRESH", minutes_ago=0)
+        self.payment("mpesa", "ws_CO_DONE", status="completed")
+        self.payment("airtel", None)
+        self.assertEqual([p.pk for p in stale_pending_payments(timedelta(minutes=2), 500)], [stale.pk])
+
+    def test_provider_answers_are_settled_and_errors_leave_payments_pending(self, mpesa_token, airtel_token):
+        paid = self.payment("mpesa", "ws_CO_PAID", minutes_ago=30)
+        cancelled = self.payment("mpesa", "ws_CO_CANCELLED")
+        waiting = self.payment("mpesa", "ws_CO_WAITING")
+        failed = self.payment("airtel", "TXN-FAILED")
+        in_progress = self.payment("airtel", "TXN-WAITING")
+        unreachable = self.payment("airtel", "TXN-DOWN", minutes_ago=60)
+        fresh = self.payment("mpesa", "ws_CO_PAID", minutes_ago=0)
+
+        with mock.patch("Payment.services.status_poller.MPesaService.stk_query", side_effect=self.stk_results) as stk_query, \
+                mock.patch("Payment.services.status_poller.AirtelMoneyService.check_transaction_status",
+                           side_effect=self.airtel_results):
+            result = poll_pending_payments()
+
+        self.assertEqual(result, {"checked": 6, "settled": 3})
+        self.assertEqual(stk_query.call_count, 3)
+        statuses = dict(Payment.objects.values_list("pk", "status"))
+        self.assertEqual(
+            [statuses[p.pk] for p in (paid, cancelled, waiting, failed, in_progress, unreachable, fresh)],
+            ["completed", "cancelled", "pending", "failed", "pending", "pending", "pending"],
+        )
+        self.assertEqual(Order.objects.get(pk=paid.order_id).status, "paid")
+        self.assertEqual(Order.objects.get(pk=failed.order_id).status, "pending")
+        mpesa_token.assert_called_once()
+        airtel_token.assert_called_once()
+
+    def test_command_reports_the_batch(self, mpesa_token, airtel_token):
+        self.payment("mpesa", "ws_CO_PAID")
+        self.payment("airtel", "TXN-DOWN")
+        out = io.StringIO()
+        with mock.patch("Payment.services.status_poller.MPesaService.stk_query", side_effect=self.stk_results), \
+                mock.patch("Payment.services.status_poller.AirtelMoneyService.check_transaction_status",
+                           side_effect=self.airtel_results):
+            call_command("poll_payment_status", "--older-than", "5", stdout=out)
+        self.assertIn("Checked 2 payment(s), settled 1.", out.getvalue())
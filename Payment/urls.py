@@ -5,10 +5,12 @@ urlpatterns = [
     # API endpoints from PaymentViewSet
     path('initiate/', views.initiate_payment, name='initiate_payment'),
     path('mpesa/callback/', views.mpesa_callback, name='mpesa_callback'),
+    path('airtel/callback/', views.airtel_callback, name='airtel_callback'),
     path('status/<int:payment_id>/', views.check_payment_status, name='payment_status'),
 
     # Admin/staff-only endpoints
     path("admin/list/", admin_views.list_payments, name="list_payments"),
+    path("admin/reconcile/", admin_views.bulk_reconcile_payments, name="bulk_reconcile_payments"),
     path("admin/<int:payment_id>/", admin_views.payment_detail, name="payment_detail"),
     path("admin/<int:payment_id>/reconcile/", admin_views.reconcile_payment, name="reconcile_payment"),
 ]
@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -6,12 +8,16 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse
 
+from BackEnd import metrics
 from .models import Payment
 from .services.mpesa_service import MPesaService
 from .services.airtel_service import AirtelMoneyService
+from .services.settlement import PaymentOutcome, airtel_outcome, settle_payments
 from Shop.models import Order, OrderItem
 from .serializers import PaymentSerializer
 
+logger = logging.getLogger(__name__)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -71,6 +77,7 @@ def initiate_payment(request):
             amount=total,
             status='pending'
         )
+        metrics.PAYMENTS.labels(payment_method, "initiated").inc()
         
         # Initiate payment based on method
         if payment_method == 'mpesa':
@@ -95,6 +102,7 @@ def initiate_payment(request):
                 })
             else:
                 payment.status = 'failed'
+                metrics.PAYMENTS.labels(payment_method, "initiation_failed").inc()
                 payment.result_desc = result.get('errorMessage', 'Payment initiation failed')
                 payment.save()
                 return Response(
@@ -123,6 +131,7 @@ def initiate_payment(request):
                 })
             else:
                 payment.status = 'failed'
+                metrics.PAYMENTS.labels(payment_method, "initiation_failed").inc()
                 payment.result_desc = result.get('status', {}).get('message', 'Payment failed')
                 payment.save()
                 return Response(
@@ -137,6 +146,7 @@ def initiate_payment(request):
             )
     
     except Exception as e:
+        logger.exception("Payment initiation failed", extra={"payment_method": payment_method})
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -150,39 +160,75 @@ def mpesa_callback(request):
     data = request.data
     
     try:
-        result_code = data['Body']['stkCallback']['ResultCode']
-        checkout_request_id = data['Body']['stkCallback']['CheckoutRequestID']
+        stk_callback = data['Body']['stkCallback']
+        result_code = stk_callback['ResultCode']
+        checkout_request_id = stk_callback['CheckoutRequestID']
+        logger.info(
+            "M-Pesa callback with result %s", result_code,
+            extra={"checkout_request_id": checkout_request_id},
+        )
         
-        payment = Payment.objects.get(checkout_request_id=checkout_request_id)
+        payment = Payment.objects.only('id').get(checkout_request_id=checkout_request_id)
         
         if result_code == 0:
             # Payment successful
-            callback_metadata = data['Body']['stkCallback']['CallbackMetadata']['Item']
-            
-            for item in callback_metadata:
-                if item['Name'] == 'MpesaReceiptNumber':
-                    payment.transaction_id = item['Value']
-            
-            payment.status = 'completed'
-            payment.result_desc = 'Payment successful'
-            payment.save()
-            
-            # Update order status
-            payment.order.status = 'paid'
-            payment.order.save()
-            
+            callback_metadata = stk_callback['CallbackMetadata']['Item']
+            receipt_number = next(
+                (item.get('Value') for item in callback_metadata if item['Name'] == 'MpesaReceiptNumber'),
+                None
+            )
+            outcome = PaymentOutcome(payment.id, 'completed', receipt_number, 'Payment successful')
         else:
             # Payment failed
-            payment.status = 'failed'
-            payment.result_desc = data['Body']['stkCallback'].get('ResultDesc', 'Payment failed')
-            payment.save()
+            outcome = PaymentOutcome(
+                payment.id, 'failed', None, stk_callback.get('ResultDesc', 'Payment failed')
+            )
+        
+        # Settles the payment and marks the order paid (no-op if already settled)
+        settle_payments([outcome])
         
         return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
     
     except Exception as e:
+        logger.exception("Could not process M-Pesa callback")
         return JsonResponse({"ResultCode": 1, "ResultDesc": str(e)})
 
 
+@csrf_exempt
+@api_view(['POST'])
+def airtel_callback(request):
+    """
+    Handle Airtel Money callback.
+
+    The callback is unauthenticated, so it is only taken as a hint: the payment is settled
+    with the status Airtel's transaction enquiry reports, never with the posted one.
+    """
+    transaction_data = request.data.get('transaction', {})
+    
+    try:
+        payment = Payment.objects.only('id', 'status', 'transaction_id').get(
+            payment_method='airtel',
+            transaction_id=transaction_data['id']
+        )
+        
+        # Redelivered callbacks for settled payments, and TIP/TA (in progress / ambiguous),
+        # need no enquiry; pending ones are left for the status poller
+        if payment.status == 'pending' and airtel_outcome(payment.id, transaction_data):
+            result = AirtelMoneyService().check_transaction_status(payment.transaction_id)
+            outcome = airtel_outcome(payment.id, result.get('data', {}).get('transaction', {}))
+            if outcome:
+                settle_payments([outcome])
+        
+        return JsonResponse({"status": "Accepted"})
+    
+    except Payment.DoesNotExist:
+        logger.warning("Airtel callback for unknown transaction %s", transaction_data.get('id'))
+        return JsonResponse({"status": "Rejected", "message": "Unknown transaction"}, status=404)
+    except Exception as e:
+        logger.exception("Could not process Airtel callback")
+        return JsonResponse({"status": "Rejected", "message": str(e)}, status=400)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_payment_status(request, payment_id):
@@ -0,0 +1,215 @@
+"""
+Audit log writer.
+
+Audit rows are written inside the transaction whose change they record, so a committed
+change always has its audit row, and a write that fails rolls the change back with it.
+
+`audit.atomic()` is transaction.atomic() for a unit of work (a request's state change,
+a bulk restock, a reconciliation). Entries recorded directly in it are buffered and
+written with one bulk_create as the block ends, still inside the transaction. A nested
+audit.atomic() hands its entries to the enclosing one when it succeeds and drops them
+when it rolls back. Entries recorded anywhere else inside a transaction, including a
+plain savepoint within a unit of work, are written at once, so they roll back with their
+savepoint. Outside a transaction they are written straight away, as autocommit would.
+
+With AUDIT_LOG_BACKGROUND_WRITER enabled the entries are handed at commit to a
+per-process writer thread instead, which batches them across requests. That takes the
+INSERT off the request path entirely, but the write is then no longer part of the
+transaction: entries still queued when the process is killed hard, or that cannot be
+written, are logged rather than stored. Keep it off where every row must land.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# One open audit.atomic() block: its connection, atomic nesting depth and buffered entries
+_Unit = namedtuple("_Unit", "alias depth entries")
+_local = threading.local()
+
+
+def _units():
+    if not hasattr(_local, "units"):
+        _local.units = []
+    return _local.units
+
+
+def _depth(connection):
+    # Atomic blocks nested in the outermost one, each with its savepoint (or None)
+    return len(connection.savepoint_ids)
+
+
+def _current_unit(connection):
+    for unit in reversed(_units()):
+        if unit.alias == connection.alias:
+            return unit
+    return None
+
+
+@contextmanager
+def atomic(using=None):
+    """transaction.atomic() whose directly recorded audit entries are written in one batch."""
+    with transaction.atomic(using=using):
+        connection = transaction.get_connection(using)
+        parent = _current_unit(connection)
+        unit = _Unit(connection.alias, _depth(connection), [])
+        _units().append(unit)
+        try:
+            yield
+        finally:
+            _units().pop()
+        # Only reached when the block succeeded; still inside its transaction
+        if parent is not None and parent.depth == unit.depth - 1:
+            parent.entries.extend(unit.entries)
+        else:
+            _write_in_transaction(unit.entries)
+
+
+def record(**fields):
+    """Record one AuditLog built from `fields`."""
+    record_many([AuditLog(**fields)])
+
+
+def record_many(entries):
+    """Record unsaved AuditLog instances as part of the current transaction (see above)."""
+    entries = list(entries)
+    if not entries:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _dispatch(entries)
+        return
+    unit = _current_unit(connection)
+    if unit is not None and unit.depth == _depth(connection):
+        unit.entries.extend(entries)
+    else:
+        _write_in_transaction(entries)
+
+
+def _write_in_transaction(entries):
+    if not entries:
+        return
+    writer = background_writer()
+    if writer is not None:
+        # Discarded by Django if the transaction (or savepoint) rolls back
+        transaction.on_commit(lambda: writer.submit(entries), robust=True)
+    else:
+        # No catch: a failure here aborts the transaction that made the change
+        AuditLog.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def _dispatch(entries):
+    writer = background_writer()
+    if writer is not None:
+        writer.submit(entries)
+    else:
+        write(entries)
+
+
+def write(entries):
+    """
+    bulk_create `entries` outside any transaction (autocommit or the background writer),
+    retrying once; entries that still fail are logged in full.
+    """
+    for attempt in (1, 2):
+        try:
+            AuditLog.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+            return
+        except Exception:
+            if attempt == 2:
+                logger.exception("Could not write %d audit entries: %s", len(entries), _describe(entries))
+            else:
+                close_old_connections()
+
+
+def _describe(entries):
+    return [
+        {"action_type": e.action_type, "user_id": e.user_id, "order_id": e.order_id,
+         "product_id": e.product_id, "description": e.description}
+        for e in entries
+    ]
+
+
+# --- Background writer ---
+
+class BackgroundWriter:
+    """Daemon thread that drains queued entries in batches of up to `batch_size`."""
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, entries):
+        self.queue.put(entries)
+
+    def stop(self, timeout=5):
+        self.queue.put(None)
+        self.thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            leftover.extend(item or ())
+        if leftover:
+            logger.error("Audit writer stopped with %d unwritten entries: %s", len(leftover), _describe(leftover))
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while item is not None:
+                batch.extend(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=0.05)
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if batch:
+                write(batch)
+                close_old_connections()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def background_writer():
+    """The process's writer thread, or None when AUDIT_LOG_BACKGROUND_WRITER is off."""
+    global _writer, _writer_pid
+    if not getattr(settings, "AUDIT_LOG_BACKGROUND_WRITER", False):
+        return None
+    # Started lazily and per pid, so a preforked worker never inherits a dead thread
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer = BackgroundWriter(
+                    batch_size=getattr(settings, "AUDIT_LOG_BATCH_SIZE", BATCH_SIZE),
+                    flush_interval=getattr(settings, "AUDIT_LOG_FLUSH_INTERVAL", 1.0),
+                )
+                _writer_pid = os.getpid()
+                atexit.register(_writer.stop)
+    return _writer
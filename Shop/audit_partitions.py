@@ -0,0 +1,193 @@
+# shop/audit_partitions.py
+"""
+Monthly partitions for AuditLog, with retention and archival.
+
+On PostgreSQL the audit table is declaratively partitioned by RANGE(created_at): one
+partition per calendar month plus a DEFAULT partition that catches anything no month
+partition covers, so an insert can never fail for lack of a partition. Queries bounded on
+created_at only scan the matching months, and expiring a month is a DETACH + DROP instead
+of a huge DELETE.
+
+Other backends keep the single table with an index on created_at. A "partition" is then
+just a month range of that table, so archival works the same way everywhere; only the
+final drop turns into a chunked DELETE.
+
+expire_month() archives and drops a month in one transaction, so the archive always holds
+exactly the rows that were dropped: if either step fails nothing is dropped, and a re-run
+rewrites the same archive file.
+"""
+import gzip
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+CHUNK_SIZE = 5000
+
+
+def month_start(value):
+    value = timezone.localtime(value) if isinstance(value, datetime) else value
+    return datetime(value.year, value.month, 1, tzinfo=timezone.get_current_timezone())
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def retention_cutoff(months=None):
+    """First month that is kept; everything before it is archived."""
+    months = settings.AUDIT_LOG_RETENTION_MONTHS if months is None else months
+    return add_months(month_start(timezone.now()), -months)
+
+
+def is_partitioned(conn=connection):
+    if conn.vendor != "postgresql":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [conn.ops.quote_name(TABLE)]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def attached_partitions(conn=connection):
+    """Names of the month partitions currently attached to the audit table."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) AND c.relname <> %s",
+            [conn.ops.quote_name(TABLE), DEFAULT_PARTITION],
+        )
+        return {name for (name,) in cursor.fetchall()}
+
+
+def ensure_partitions(months_ahead=3, start=None, conn=connection):
+    """
+    Create the month partitions from `start` (default: this month) to `months_ahead` ahead.
+
+    Rows for a month that already landed in the DEFAULT partition are moved into the new
+    partition before it is attached. Returns the names created; a no-op off PostgreSQL.
+    """
+    if not is_partitioned(conn):
+        return []
+    quote = conn.ops.quote_name
+    existing = attached_partitions(conn)
+    month = month_start(start or timezone.now())
+    last = add_months(month_start(timezone.now()), months_ahead)
+    created = []
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        while month <= last:
+            name = partition_name(month)
+            if name not in existing:
+                bounds = [month, add_months(month, 1)]
+                cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS)")
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} "
+                    f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                    f"INSERT INTO {quote(name)} SELECT * FROM moved",
+                    bounds,
+                )
+                cursor.execute(
+                    f"ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+                    bounds,
+                )
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def expired_months(cutoff, conn=connection):
+    """Months before `cutoff` that still hold audit rows (or an attached partition)."""
+    months = {
+        month_start(value)
+        for value in AuditLog.objects.filter(created_at__lt=cutoff).dates("created_at", "month")
+    }
+    if is_partitioned(conn):
+        for name in attached_partitions(conn):
+            month = datetime.strptime(name[-6:], "%Y%m").replace(tzinfo=timezone.get_current_timezone())
+            if month < cutoff:
+                months.add(month)
+    return sorted(months)
+
+
+def month_rows(month):
+    return (
+        AuditLog.objects.filter(created_at__gte=month, created_at__lt=add_months(month, 1))
+        .order_by("id")
+        .values()
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def archive_month(month, directory):
+    """
+    Stream one month of audit rows to `<directory>/auditlog-YYYY-MM.ndjson.gz`.
+
+    The file is written under a temporary name, fsynced and then renamed, so a crash never
+    leaves a truncated archive that looks complete. Returns (path, row count).
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"auditlog-{month:%Y-%m}.ndjson.gz")
+    partial = path + ".partial"
+    encoder = DjangoJSONEncoder()
+    count = 0
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+            for row in month_rows(month):
+                archive.write((encoder.encode(row) + "\n").encode())
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+    return path, count
+
+
+def lock_month(month, conn=connection):
+    """Block writes to a month's partition until the transaction ends (PostgreSQL only)."""
+    if is_partitioned(conn) and partition_name(month) in attached_partitions(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {conn.ops.quote_name(partition_name(month))} IN EXCLUSIVE MODE")
+
+
+def expire_month(month, directory, conn=connection):
+    """Archive one month and drop it in the same transaction. Returns (path, row count)."""
+    with transaction.atomic(using=conn.alias):
+        lock_month(month, conn)
+        path, count = archive_month(month, directory)
+        drop_month(month, conn)
+    return path, count
+
+
+def drop_month(month, conn=connection):
+    """Remove one month of audit rows: drop its partition, or DELETE it in chunks."""
+    bounds = {"created_at__gte": month, "created_at__lt": add_months(month, 1)}
+    if is_partitioned(conn):
+        quote = conn.ops.quote_name
+        name = partition_name(month)
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            if name in attached_partitions(conn):
+                cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            # Stragglers that were routed to the DEFAULT partition
+            AuditLog.objects.filter(**bounds).delete()
+        return
+
+    with transaction.atomic(using=conn.alias):
+        while True:
+            ids = list(AuditLog.objects.filter(**bounds).values_list("id", flat=True)[:CHUNK_SIZE])
+            if not ids:
+                return
+            AuditLog.objects.filter(id__in=ids).delete()
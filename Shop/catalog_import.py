@@ -0,0 +1,283 @@
+# shop/catalog_import.py
+"""
+Bulk catalog import.
+
+Rows (CSV or JSON) describe one variant each: name, category, description, image,
+size, price, stock. Products are upserted by name and variants by (product, size)
+with bulk_create(update_conflicts=True), one transaction per batch.
+"""
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .facets import rebuild_facets
+from .models import Product, ProductVariant
+from .search import index_products
+
+IMAGE_UPLOAD_DIR = "products"
+MAX_REPORTED_ERRORS = 100
+
+# Column limits, so bad rows are reported instead of failing the batch's INSERT
+TEXT_LIMITS = {
+    "name": Product._meta.get_field("name").max_length,
+    "category": Product._meta.get_field("category").max_length,
+    "image": Product._meta.get_field("image").max_length,
+    "size": ProductVariant._meta.get_field("size").max_length,
+}
+MAX_PRICE = Decimal(10) ** (
+    ProductVariant._meta.get_field("price").max_digits - ProductVariant._meta.get_field("price").decimal_places
+)
+MAX_STOCK = 2**31 - 1
+
+
+def read_rows(fileobj, fmt):
+    """
+    Yield flat variant rows from a CSV or JSON file object.
+    JSON may be a list of rows or of products with a nested "variants" list.
+    """
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig")
+
+    if fmt == "csv":
+        yield from csv.DictReader(fileobj)
+        return
+
+    data = json.load(fileobj)
+    if isinstance(data, dict):
+        data = data.get("products", [])
+    if not isinstance(data, list):
+        raise ValueError("expected a list of products")
+    yield from flatten_products(data)
+
+
+def flatten_products(products):
+    """
+    Yield one row per variant. Entries that are not objects, or whose "variants" is not a
+    list, are passed through as they are for _clean to reject with their row number.
+    """
+    for product in products:
+        variants = product.get("variants") if isinstance(product, dict) else None
+        if not isinstance(variants, list):
+            yield product
+            continue
+        base = {key: value for key, value in product.items() if key != "variants"}
+        for variant in variants:
+            yield {**base, **variant} if isinstance(variant, dict) else variant
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, (str, int, float, Decimal)):
+        raise ValueError(f"invalid {field} {value!r}")
+    value = str(value).strip()
+    max_length = TEXT_LIMITS.get(field)
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _clean(row):
+    """Validate one row against the model's columns; ValueError is reported as a row error."""
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+    if "variants" in row:
+        raise ValueError("variants must be a list of objects")
+    name = _text(row, "name")
+    if not name:
+        raise ValueError("name is required")
+    category = _text(row, "category")
+    if not category:
+        raise ValueError("category is required")
+
+    try:
+        price = Decimal(str(row.get("price")).strip())
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"invalid price {row.get('price')!r}")
+    if not price.is_finite() or not 0 <= price < MAX_PRICE or price != price.quantize(Decimal("0.01")):
+        raise ValueError(f"invalid price {row.get('price')!r}")
+
+    stock = row.get("stock")
+    if stock in (None, ""):
+        stock = None
+    else:
+        try:
+            stock = int(stock)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"invalid stock {stock!r}")
+        if not 0 <= stock <= MAX_STOCK:
+            raise ValueError(f"invalid stock {stock!r}")
+
+    return {
+        "name": name,
+        "category": category,
+        "description": _text(row, "description"),
+        "image": _text(row, "image"),
+        "size": _text(row, "size"),
+        "price": price,
+        "stock": stock,
+    }
+
+
+def _resolve_image(filename, images_dir, dry_run):
+    """Return the storage name for a row's image, copying it from images_dir if needed."""
+    if not filename:
+        return None
+    if not images_dir:
+        # Already a path inside MEDIA_ROOT, e.g. "products/Apple.jpg"
+        return filename
+
+    basename = os.path.basename(filename)
+    stored_name = f"{IMAGE_UPLOAD_DIR}/{basename}"
+    if default_storage.exists(stored_name):
+        return stored_name
+
+    source = os.path.join(images_dir, basename)
+    if not os.path.isfile(source):
+        raise ValueError(f"image {basename!r} not found in {images_dir}")
+    if dry_run:
+        return stored_name
+    with open(source, "rb") as fh:
+        return default_storage.save(stored_name, File(fh, name=basename))
+
+
+def _upsert(model, objs, unique_fields, update_fields):
+    if objs:
+        model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=[*update_fields, "updated_at"],
+        )
+
+
+def _import_batch(rows, stats, seen_products, images_dir, dry_run):
+    products, variants = {}, {}
+    for line, row in rows:
+        try:
+            row = _clean(row)
+            image = _resolve_image(row["image"], images_dir, dry_run)
+        except ValueError as exc:
+            stats["errors"] += 1
+            if len(stats["error_details"]) < MAX_REPORTED_ERRORS:
+                stats["error_details"].append({"row": line, "error": str(exc)})
+            continue
+
+        product = products.setdefault(row["name"], {"category": row["category"]})
+        product["category"] = row["category"]
+        if row["description"]:
+            product["description"] = row["description"]
+        if image:
+            product["image"] = image
+        variants[(row["name"], row["size"])] = {"price": row["price"], "stock": row["stock"]}
+
+    if not products:
+        return
+
+    existing = {
+        p["name"]: p
+        for p in Product.objects.filter(name__in=list(products)).values(
+            "id", "name", "description", "category", "image"
+        )
+    }
+    for name, product in products.items():
+        # Products whose variants span several batches are only counted once
+        if name in seen_products:
+            continue
+        seen_products.add(name)
+        current = existing.get(name)
+        if current is None:
+            stats["products_created"] += 1
+        elif any(current[field] != value for field, value in product.items()):
+            stats["products_updated"] += 1
+        else:
+            stats["products_unchanged"] += 1
+    stats["images_attached"] += sum(
+        1 for name, p in products.items()
+        if "image" in p and (name not in existing or existing[name]["image"] != p["image"])
+    )
+
+    existing_variants = {
+        (v["product__name"], v["size"]): v
+        for v in ProductVariant.objects.filter(product__name__in=list(products)).values(
+            "product__name", "size", "price", "stock"
+        )
+    }
+    for key, variant in variants.items():
+        current = existing_variants.get(key)
+        if current is None:
+            stats["variants_created"] += 1
+        elif current["price"] != variant["price"] or (
+            variant["stock"] is not None and current["stock"] != variant["stock"]
+        ):
+            stats["variants_updated"] += 1
+        else:
+            stats["variants_unchanged"] += 1
+
+    if dry_run:
+        return
+
+    with transaction.atomic():
+        # Optional columns are only overwritten when the import provides them,
+        # so each combination of provided columns is upserted separately.
+        groups = {}
+        for name, product in products.items():
+            groups.setdefault(tuple(sorted(product)), []).append(Product(name=name, **product))
+        for fields, objs in groups.items():
+            _upsert(Product, objs, ["name"], list(fields))
+
+        batch_products = list(
+            Product.objects.filter(name__in=list(products)).only("id", "name", "category", "description")
+        )
+        # bulk_create skips post_save, so refresh the search index here
+        index_products(batch_products)
+        product_ids = {product.name: product.id for product in batch_products}
+        with_stock, without_stock = [], []
+        for (name, size), variant in variants.items():
+            obj = ProductVariant(product_id=product_ids[name], size=size, price=variant["price"])
+            if variant["stock"] is None:
+                without_stock.append(obj)
+            else:
+                obj.stock = variant["stock"]
+                with_stock.append(obj)
+        _upsert(ProductVariant, with_stock, ["product", "size"], ["price", "stock"])
+        _upsert(ProductVariant, without_stock, ["product", "size"], ["price"])
+
+
+def import_catalog(rows, images_dir=None, batch_size=1000, dry_run=False):
+    """Import an iterable of rows in batches and return a summary of what changed (or would change)."""
+    stats = {
+        "rows": 0,
+        "products_created": 0,
+        "products_updated": 0,
+        "products_unchanged": 0,
+        "variants_created": 0,
+        "variants_updated": 0,
+        "variants_unchanged": 0,
+        "images_attached": 0,
+        "errors": 0,
+        "error_details": [],
+        "dry_run": dry_run,
+    }
+    # Row numbers are reported 1-based, counting the CSV header as row 1
+    numbered = enumerate(rows, start=2)
+    seen_products = set()
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        stats["rows"] += len(batch)
+        _import_batch(batch, stats, seen_products, images_dir, dry_run)
+
+    if not dry_run and stats["rows"]:
+        # bulk_create bypasses the signals that maintain facet counts
+        rebuild_facets()
+    return stats
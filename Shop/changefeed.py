@@ -0,0 +1,64 @@
+# shop/changefeed.py
+"""
+Order change feed.
+
+Every write to an order stamps it with the next value of the ORDERS ChangeCounter
+(Order.save and the state machine), and a deleted order leaves an OrderTombstone with a
+stamp of its own. Taking a value is one UPDATE ... RETURNING that locks the counter row
+until commit, which is what makes seqs become visible in order (a database sequence
+would not: a later seq could commit first and a client would skip the earlier one).
+Order.save writes the seq in the same statement as the row; the state machine stamps
+last, so other order writes only wait for the commit, not for stock, payments or audit.
+A client remembers the highest seq it has applied and asks for everything after it, so
+each poll returns only what changed.
+
+Orders moved together by transition_many share one seq, so a page always ends on a seq
+boundary and may run a little over `limit`.
+"""
+from django.utils import timezone
+
+from .models import ChangeCounter, Order
+
+ORDER_FIELDS = [
+    "id", "user_id", "status", "total_price", "created_at", "updated_at", "last_modified_by_id", "change_seq",
+]
+
+
+def stamp(order_ids):
+    """Give the orders one new seq and return it; the last statement of the writing transaction."""
+    change_seq = ChangeCounter.next(ChangeCounter.ORDERS)
+    Order.objects.filter(pk__in=order_ids).update(change_seq=change_seq, updated_at=timezone.now())
+    return change_seq
+
+
+def _seqs(queryset, since, limit):
+    return queryset.filter(change_seq__gt=since).order_by("change_seq").values_list("change_seq", flat=True)[:limit]
+
+
+def changes_since(orders, tombstones, since=0, limit=200):
+    """
+    Changes with seq > `since` from the `orders` and `tombstones` querysets, oldest first.
+
+    Returns (changes, cursor, has_more). Each change is {"seq", "op", "order"} where op is
+    "upsert", "cancelled" (order dict as for upsert) or "deleted" (order is just {"id"}).
+    """
+    seqs = sorted(set(_seqs(orders, since, limit)) | set(_seqs(tombstones, since, limit)))[:limit]
+    if not seqs:
+        return [], since, False
+    upto = seqs[-1]
+
+    window = {"change_seq__gt": since, "change_seq__lte": upto}
+    changes = [
+        {"seq": row["change_seq"], "op": "cancelled" if row["status"] == "cancelled" else "upsert", "order": row}
+        for row in orders.filter(**window).values(*ORDER_FIELDS)
+    ]
+    changes.extend(
+        {"seq": seq, "op": "deleted", "order": {"id": order_id}}
+        for order_id, seq in tombstones.filter(**window).values_list("order_id", "change_seq")
+    )
+    changes.sort(key=lambda change: (change["seq"], change["order"]["id"]))
+
+    has_more = (
+        orders.filter(change_seq__gt=upto).exists() or tombstones.filter(change_seq__gt=upto).exists()
+    )
+    return changes, upto, has_more
@@ -0,0 +1,105 @@
+# shop/facets.py
+"""
+Materialized catalog facet counts.
+
+CatalogFacet rows hold the number of products per category and of variants per price
+band. Signals apply +1/-1 deltas as rows change, so browsing reads a handful of rows
+instead of aggregating the catalog. Bulk writers that bypass signals (the catalog
+importer) call rebuild_facets(); `check_facets` verifies the table against the source.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+
+from .models import CatalogFacet, Product, ProductVariant
+from .search import PRICE_BANDS, price_band_filter
+
+
+def price_band(price):
+    """Label of the band a price falls in (None for a missing price)."""
+    if price is None:
+        return None
+    for label, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def bump(kind, value, delta):
+    """Atomically add `delta` to one facet count, creating the row on first use."""
+    if value is None or not delta:
+        return
+    updated = CatalogFacet.objects.filter(kind=kind, value=value).update(count=F("count") + delta)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            CatalogFacet.objects.create(kind=kind, value=value, count=delta)
+    except IntegrityError:
+        # Another writer created it first
+        CatalogFacet.objects.filter(kind=kind, value=value).update(count=F("count") + delta)
+
+
+def compute_actual():
+    """Facet counts straight from Product / ProductVariant."""
+    actual = {
+        ("category", row["category"]): row["count"]
+        for row in Product.objects.values("category").annotate(count=Count("id"))
+    }
+    bands = ProductVariant.objects.aggregate(**{
+        label: Count("id", filter=price_band_filter((label, low, high)))
+        for label, low, high in PRICE_BANDS
+    })
+    actual.update({("price_band", label): count for label, count in bands.items()})
+    return actual
+
+
+def stored_counts():
+    return {(f.kind, f.value): f.count for f in CatalogFacet.objects.all()}
+
+
+def find_mismatches():
+    """[(kind, value, stored, actual)] for every facet whose stored count is wrong."""
+    actual, stored = compute_actual(), stored_counts()
+    return [
+        (kind, value, stored.get((kind, value), 0), actual.get((kind, value), 0))
+        for kind, value in sorted(set(actual) | set(stored))
+        if stored.get((kind, value), 0) != actual.get((kind, value), 0)
+    ]
+
+
+def rebuild_facets():
+    """
+    Replace the stored counts with fresh ones.
+
+    The facet table is locked before counting, so a bump() from a transaction that is
+    still open either finishes first (and its rows are counted) or waits and applies its
+    delta on top of the new counts; neither is lost. SQLite has no table locks, but the
+    DELETE takes its single write lock before anything is counted.
+    """
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(CatalogFacet._meta.db_table)} IN EXCLUSIVE MODE"
+                )
+        CatalogFacet.objects.all().delete()
+        actual = compute_actual()
+        CatalogFacet.objects.bulk_create(
+            [CatalogFacet(kind=kind, value=value, count=count) for (kind, value), count in actual.items()]
+        )
+
+
+def facet_counts():
+    """Facets in the same shape as the search endpoint's `facets`."""
+    stored = stored_counts()
+    categories = sorted(
+        ((value, count) for (kind, value), count in stored.items() if kind == "category" and count > 0),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return {
+        "category": [{"value": value, "count": count} for value, count in categories],
+        "price_band": [
+            {"value": label, "count": stored.get(("price_band", label), 0)}
+            for label, _, _ in PRICE_BANDS
+        ],
+    }
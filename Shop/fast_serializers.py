@@ -0,0 +1,202 @@
+# shop/fast_serializers.py
+"""
+Read-only fast paths for the product and order endpoints.
+
+The output matches ProductSerializer / OrderSerializer field for field, but rows come from
+a couple of values() queries and each field is produced by a getter built once per
+request, so no serializer instances, model instances or field introspection are involved
+per row. Writes keep using the regular serializers.
+
+Both paths take the shape requested with ?fields= and ?expand= (see `requested_shape`):
+only the columns behind the requested fields are selected, and a nested relation that is
+left out or not expanded skips its query or join. Without either parameter the output is
+the full serializer representation.
+"""
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.db.models import Min
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .images import srcset
+from .models import OrderItem, ProductVariant
+
+# DRF's own field conversions, so dates and decimals render exactly as before
+_datetime = serializers.DateTimeField().to_representation
+_total_price = serializers.DecimalField(max_digits=12, decimal_places=2).to_representation
+
+# Output field -> columns it is built from
+PRODUCT_FIELDS = {
+    "id": [],
+    "name": ["name"],
+    "description": ["description"],
+    "category": ["category"],
+    "image": ["image"],
+    "image_srcset": ["image_renditions"],
+    "variants": [],
+    "price": [],
+    "created_at": ["created_at"],
+}
+PRODUCT_EXPANDABLE = ["variants"]
+
+ORDER_FIELDS = {
+    "id": [],
+    "user": ["user_id"],
+    "items": [],
+    "status": ["status"],
+    "total_price": ["total_price"],
+    "created_at": ["created_at"],
+}
+ORDER_EXPANDABLE = ["user", "items", "items.variant"]
+USER_COLUMNS = ["user__username", "user__first_name", "user__last_name"]
+
+VARIANT_COLUMNS = ["id", "product_id", "size", "price", "stock"]
+ITEM_VARIANT_COLUMNS = ["variant_id", "variant__product_id", "variant__size", "variant__price", "variant__stock"]
+
+
+def _names(params, key, allowed):
+    value = params.get(key)
+    if value is None:
+        return None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError({key: f"Unknown: {', '.join(unknown)}. Choose from: {', '.join(allowed)}."})
+    return names
+
+
+def requested_shape(params, fields, expandable):
+    """
+    (fields, expand) from ?fields=a,b and ?expand=x,y.
+
+    Missing ?fields= means every field; missing ?expand= means every nested relation is
+    expanded (the full representation). Relations that are not expanded render as ids.
+    Expanding "a.b" implies "a".
+    """
+    selected = _names(params, "fields", list(fields))
+    expand = _names(params, "expand", expandable)
+    if expand is None:
+        expand = set(expandable)
+    else:
+        expand = set(expand) | {name.split(".")[0] for name in expand}
+    # Output keeps the serializer's field order; id is always included
+    selected = [name for name in fields if selected is None or name in selected or name == "id"]
+    return selected, expand
+
+
+def _url_builder(request):
+    return request.build_absolute_uri if request is not None else str
+
+
+def _price(value):
+    return float(value) if value is not None else 0.0
+
+
+def variant_dict(variant_id, product_id, size, price, stock):
+    return {"id": variant_id, "product": product_id, "size": size, "price": _price(price), "stock": stock}
+
+
+def product_getters(request):
+    """Output field -> function(row, variants) for ProductSerializer's fields."""
+    build_url = _url_builder(request)
+
+    def image(row, variants):
+        return build_url(default_storage.url(row["image"])) if row["image"] else None
+
+    def price(row, variants):
+        if "min_price" in row:
+            return _price(row["min_price"])
+        return min((variant["price"] for variant in variants), default=0.0)
+
+    return {
+        "id": lambda row, variants: row["id"],
+        "name": lambda row, variants: row["name"],
+        "description": lambda row, variants: row["description"],
+        "category": lambda row, variants: row["category"],
+        "image": image,
+        "image_srcset": lambda row, variants: srcset(row["image_renditions"], build_url),
+        "variants": lambda row, variants: variants,
+        "price": price,
+        "created_at": lambda row, variants: _datetime(row["created_at"]),
+    }
+
+
+def product_list(queryset, request=None, fields=None, expand=None):
+    """ProductSerializer(queryset, many=True).data, pruned to `fields` / `expand`."""
+    fields = list(PRODUCT_FIELDS) if fields is None else fields
+    expand = set(PRODUCT_EXPANDABLE) if expand is None else expand
+    full_variants = "variants" in fields and "variants" in expand
+
+    queryset = queryset.prefetch_related(None)
+    columns = ["id", *(column for name in fields for column in PRODUCT_FIELDS[name])]
+    rows = queryset.values(*columns)
+    if "price" in fields and not full_variants:
+        # No variant rows to take the minimum from; let the database do it
+        rows = rows.annotate(min_price=Min("variants__price"))
+    rows = list(rows)
+
+    variants = defaultdict(list)
+    if "variants" in fields:
+        variant_rows = ProductVariant.objects.filter(product_id__in=queryset.values("id")).order_by("id")
+        if full_variants:
+            for values in variant_rows.values_list(*VARIANT_COLUMNS).iterator():
+                variants[values[1]].append(variant_dict(*values))
+        else:
+            for product_id, variant_id in variant_rows.values_list("product_id", "id").iterator():
+                variants[product_id].append(variant_id)
+
+    getters = [(name, getter) for name, getter in product_getters(request).items() if name in fields]
+    return [
+        {name: getter(row, variants[row["id"]]) for name, getter in getters}
+        for row in rows
+    ]
+
+
+def order_list(queryset, request=None, fields=None, expand=None):
+    """OrderSerializer(queryset, many=True).data from stored totals, pruned to `fields` / `expand`."""
+    fields = list(ORDER_FIELDS) if fields is None else fields
+    expand = set(ORDER_EXPANDABLE) if expand is None else expand
+    expand_user = "user" in fields and "user" in expand
+
+    queryset = queryset.select_related(None).prefetch_related(None)
+    columns = ["id", *(column for name in fields for column in ORDER_FIELDS[name])]
+    rows = list(queryset.values(*columns, *(USER_COLUMNS if expand_user else [])))
+
+    items = defaultdict(list)
+    if "items" in fields:
+        item_rows = OrderItem.objects.filter(order_id__in=queryset.values("id")).order_by("id")
+        if "items" not in expand:
+            for order_id, item_id in item_rows.values_list("order_id", "id").iterator():
+                items[order_id].append(item_id)
+        elif "items.variant" in expand:
+            for item_id, order_id, quantity, *variant in item_rows.values_list(
+                "id", "order_id", "quantity", *ITEM_VARIANT_COLUMNS
+            ).iterator():
+                items[order_id].append({"id": item_id, "variant": variant_dict(*variant), "quantity": quantity})
+        else:
+            for item_id, order_id, quantity, variant_id in item_rows.values_list(
+                "id", "order_id", "quantity", "variant_id"
+            ).iterator():
+                items[order_id].append({"id": item_id, "variant": variant_id, "quantity": quantity})
+
+    def user(row):
+        if not expand_user:
+            return row["user_id"]
+        return {
+            "id": row["user_id"],
+            "username": row["user__username"],
+            "first_name": row["user__first_name"],
+            "last_name": row["user__last_name"],
+        }
+
+    getters = {
+        "id": lambda row: row["id"],
+        "user": user,
+        "items": lambda row: items[row["id"]],
+        "status": lambda row: row["status"],
+        "total_price": lambda row: _total_price(row["total_price"]),
+        "created_at": lambda row: _datetime(row["created_at"]),
+    }
+    getters = [(name, getters[name]) for name in fields]
+    return [{name: getter(row) for name, getter in getters} for row in rows]
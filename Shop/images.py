@@ -0,0 +1,71 @@
+# shop/images.py
+"""
+Responsive product images.
+
+Each product image gets resized JPEG and WebP renditions with metadata stripped. The
+storage names are kept in Product.image_renditions as {"<width>": {"jpeg": name, "webp": name}}
+so serializers can build srcset strings without touching the filesystem.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+RENDITION_WIDTHS = (320, 640, 1024)
+RENDITION_DIR = "products/renditions"
+
+# format -> (file extension, Pillow save options)
+RENDITION_FORMATS = {
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 4}),
+}
+
+
+def render_renditions(image_name, widths=RENDITION_WIDTHS):
+    """
+    Write the renditions for one stored image and return its rendition map.
+
+    Widths larger than the original are skipped (the original width is used instead),
+    and EXIF/ICC/XMP data is dropped by re-encoding without it.
+    """
+    # Pillow is only needed once an image is uploaded; keep it out of worker boot
+    from PIL import Image, ImageOps
+
+    with default_storage.open(image_name, "rb") as fh:
+        with Image.open(fh) as original:
+            # Apply the EXIF orientation before the EXIF block is thrown away
+            image = ImageOps.exif_transpose(original).convert("RGB")
+
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    targets = sorted({min(width, image.width) for width in widths})
+
+    renditions = {}
+    for width in targets:
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.Resampling.LANCZOS
+        )
+        renditions[str(width)] = {}
+        for fmt, (extension, options) in RENDITION_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), **options)
+            name = f"{RENDITION_DIR}/{stem}-{width}w.{extension}"
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            renditions[str(width)][fmt] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return renditions
+
+
+def srcset(renditions, build_url):
+    """{"jpeg": "<url> 320w, <url> 640w", "webp": "..."} from a rendition map."""
+    if not renditions:
+        return None
+    widths = sorted(renditions, key=int)
+    return {
+        fmt: ", ".join(
+            f"{build_url(default_storage.url(renditions[width][fmt]))} {width}w"
+            for width in widths
+            if fmt in renditions[width]
+        )
+        for fmt in RENDITION_FORMATS
+    }
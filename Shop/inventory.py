@@ -0,0 +1,81 @@
+# shop/inventory.py
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from BackEnd import events
+
+from . import audit
+from .models import AuditLog, ProductVariant
+
+CHUNK_SIZE = 500
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def restock_variants(items, user):
+    """
+    Add stock to many variants at once.
+
+    `items` is an iterable of (variant_id, amount) pairs; repeated variants are summed.
+    Each chunk of variants is updated with a single `stock = stock + CASE ...` statement,
+    so concurrent restocks and sales never overwrite each other. Ids that do not exist
+    (or no longer do) are neither updated nor audited. Returns
+    ({variant_id: new_stock}, [missing variant ids]).
+    """
+    amounts = {}
+    for variant_id, amount in items:
+        amounts[variant_id] = amounts.get(variant_id, 0) + amount
+
+    variants = {}
+    now = timezone.now()
+    with audit.atomic():
+        for chunk in _chunks(sorted(amounts)):
+            # Locked in id order, so only rows that still exist are updated and audited,
+            # and their stock cannot move between the read and the UPDATE
+            locked = list(
+                ProductVariant.objects.select_for_update(of=("self",))
+                .filter(id__in=chunk)
+                .order_by("id")
+                .values("id", "size", "stock", "product_id", "product__name")
+            )
+            if not locked:
+                continue
+            ProductVariant.objects.filter(id__in=[row["id"] for row in locked]).update(
+                updated_at=now,
+                stock=F("stock") + Case(
+                    *[When(id=row["id"], then=Value(amounts[row["id"]])) for row in locked],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+            for row in locked:
+                row["stock"] += amounts[row["id"]]
+                variants[row["id"]] = row
+        new_stock = {variant_id: row["stock"] for variant_id, row in variants.items()}
+
+        audit.record_many(
+            [
+                AuditLog(
+                    user=user,
+                    product_id=row["product_id"],
+                    variant_id=variant_id,
+                    action_type="product_restock",
+                    quantity_delta=amounts[variant_id],
+                    payload={"new_stock": new_stock[variant_id]},
+                    description=(
+                        f"Restocked {row['product__name']} variant {row['size'] or 'default'} "
+                        f"by {amounts[variant_id]}. New stock: {new_stock[variant_id]}"
+                    ),
+                )
+                for variant_id, row in variants.items()
+            ]
+        )
+
+    missing = [variant_id for variant_id in amounts if variant_id not in variants]
+    if new_stock:
+        events.publish(events.STOCK_CHANGED, stock=new_stock)
+    return new_stock, missing
@@ -0,0 +1,45 @@
+# shop/management/commands/archive_audit_logs.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Shop.audit_partitions import ensure_partitions, expire_month, expired_months, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive audit log months older than the retention period to gzipped NDJSON, drop them, "
+        "and create the upcoming monthly partitions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months", type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+            help="Whole months to keep in the database (default: AUDIT_LOG_RETENTION_MONTHS)",
+        )
+        parser.add_argument(
+            "--output-dir", default=settings.AUDIT_LOG_ARCHIVE_DIR,
+            help="Directory for the archive files (default: AUDIT_LOG_ARCHIVE_DIR)",
+        )
+        parser.add_argument(
+            "--months-ahead", type=int, default=3, help="Partitions to create ahead of the current month"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="List the months that would be archived and stop"
+        )
+
+    def handle(self, *args, **options):
+        months = expired_months(retention_cutoff(options["retention_months"]))
+        if options["dry_run"]:
+            for month in months:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+            self.stdout.write(f"{len(months)} month(s) past retention.")
+            return
+
+        for name in ensure_partitions(options["months_ahead"]):
+            self.stdout.write(f"Created partition {name}")
+
+        for month in months:
+            path, count = expire_month(month, options["output_dir"])
+            self.stdout.write(f"Archived {count} audit entries for {month:%Y-%m} to {path}")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(months)} month(s)."))
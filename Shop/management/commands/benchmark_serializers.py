@@ -0,0 +1,75 @@
+# shop/management/commands/benchmark_serializers.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from BackEnd.renderers import ORJSONRenderer
+from Shop.fast_serializers import product_list
+from Shop.models import Product, ProductVariant
+from Shop.serializers import ProductSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare product list serialization throughput: ProductSerializer + JSONRenderer against "
+        "the values() fast path + ORJSONRenderer. Test products are created in a transaction "
+        "that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--variants", type=int, default=3, help="Variants per product")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, options):
+        count, per_product = options["products"], options["variants"]
+        products = Product.objects.bulk_create(
+            Product(name=f"benchmark product {i}", category=f"category {i % 10}", description="x" * 200)
+            for i in range(count)
+        )
+        ProductVariant.objects.bulk_create(
+            ProductVariant(product=product, size=f"{size}L", price=100 + size, stock=size)
+            for product in products
+            for size in range(per_product)
+        )
+        queryset = Product.objects.filter(name__startswith="benchmark product ").prefetch_related("variants")
+
+        cases = {
+            "ProductSerializer + JSONRenderer": lambda: JSONRenderer().render(
+                ProductSerializer(queryset.all(), many=True).data
+            ),
+            "fast path + ORJSONRenderer": lambda: ORJSONRenderer().render(product_list(queryset.all())),
+        }
+        results = {}
+        for name, run in cases.items():
+            run()  # warm up
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            results[name] = statistics.median(timings)
+
+        self.stdout.write(f"{count} products x {per_product} variants, median of {options['repeat']} runs (incl. queries):")
+        baseline = next(iter(results.values()))
+        for name, seconds in results.items():
+            per_thousand = seconds * 1000 / count
+            self.stdout.write(
+                f"  {name:<36} {per_thousand * 1000:8.1f} ms / 1,000 products "
+                f"{count / seconds:10.0f} products/s  x{baseline / seconds:.1f}"
+            )
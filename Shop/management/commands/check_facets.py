@@ -0,0 +1,28 @@
+# shop/management/commands/check_facets.py
+from django.core.management.base import BaseCommand, CommandError
+
+from Shop.facets import find_mismatches, rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Verify the precomputed catalog facet counts against the product tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="Rebuild the facet table if it is out of date"
+        )
+
+    def handle(self, *args, **options):
+        mismatches = find_mismatches()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Facet counts are consistent."))
+            return
+
+        for kind, value, stored, actual in mismatches:
+            self.stdout.write(self.style.WARNING(f"{kind}={value}: stored {stored}, actual {actual}"))
+
+        if options["fix"]:
+            rebuild_facets()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt facet table ({len(mismatches)} count(s) corrected)."))
+        else:
+            raise CommandError(f"{len(mismatches)} facet count(s) out of date; run with --fix to rebuild.")
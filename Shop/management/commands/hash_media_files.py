@@ -0,0 +1,57 @@
+# shop/management/commands/hash_media_files.py
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from BackEnd.storage import file_hash
+from Shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Move product images and renditions to content-hashed file names"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-originals", action="store_true", help="Remove the old un-hashed files afterwards"
+        )
+
+    def _rehash(self, name, replaced):
+        if not name or file_hash(name):
+            return name
+        with default_storage.open(name, "rb") as fh:
+            new_name = default_storage.save(name, File(fh, name=name))
+        replaced.append(name)
+        return new_name
+
+    def handle(self, *args, **options):
+        updated, replaced, missing = [], [], 0
+        products = Product.objects.exclude(image="").exclude(image__isnull=True).only(
+            "id", "image", "image_renditions"
+        )
+        for product in products.iterator(chunk_size=500):
+            try:
+                image = self._rehash(product.image.name, replaced)
+                renditions = {
+                    width: {fmt: self._rehash(name, replaced) for fmt, name in formats.items()}
+                    for width, formats in (product.image_renditions or {}).items()
+                }
+            except FileNotFoundError as exc:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"Product {product.id}: {exc}"))
+                continue
+            if image != product.image.name or renditions != product.image_renditions:
+                product.image = image
+                product.image_renditions = renditions
+                product.updated_at = timezone.now()
+                updated.append(product)
+
+        Product.objects.bulk_update(updated, ["image", "image_renditions", "updated_at"], batch_size=500)
+
+        if options["delete_originals"]:
+            for name in replaced:
+                default_storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {len(updated)} product(s), re-stored {len(replaced)} file(s), {missing} missing."
+        ))
@@ -0,0 +1,57 @@
+# shop/management/commands/import_catalog.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Shop.catalog_import import import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import or update products and variants from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file (one row per variant)")
+        parser.add_argument(
+            "--format", choices=["csv", "json"], help="File format (default: from the file extension)"
+        )
+        parser.add_argument(
+            "--images-dir", help="Directory holding the image files named in the 'image' column"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows per batch / transaction"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would change without writing"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.lower().endswith(".json") else "csv")
+        images_dir = options["images_dir"]
+        if images_dir and not os.path.isdir(images_dir):
+            raise CommandError(f"Images directory not found: {images_dir}")
+
+        try:
+            with open(path, encoding="utf-8-sig") as fh:
+                stats = import_catalog(
+                    read_rows(fh, fmt),
+                    images_dir=images_dir,
+                    batch_size=options["batch_size"],
+                    dry_run=options["dry_run"],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        prefix = "[dry run] would have " if stats["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}processed {stats['rows']} row(s): "
+            f"products {stats['products_created']} created / {stats['products_updated']} updated / "
+            f"{stats['products_unchanged']} unchanged, "
+            f"variants {stats['variants_created']} created / {stats['variants_updated']} updated / "
+            f"{stats['variants_unchanged']} unchanged, "
+            f"{stats['images_attached']} image(s) attached."
+        ))
+        for error in stats["error_details"]:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['error']}"))
+        if stats["errors"]:
+            self.stdout.write(self.style.WARNING(f"{stats['errors']} row(s) skipped."))
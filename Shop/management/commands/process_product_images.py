@@ -0,0 +1,63 @@
+# shop/management/commands/process_product_images.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from Shop.images import render_renditions
+from Shop.models import Product
+
+
+def _init_worker():
+    # Needed when the start method is "spawn" (macOS/Windows); a no-op after fork
+    if not apps.ready:
+        django.setup()
+
+
+def _render(job):
+    product_id, image_name = job
+    try:
+        return product_id, render_renditions(image_name), None
+    except Exception as exc:  # reported per image, the batch carries on
+        return product_id, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate resized JPEG/WebP renditions for product images using every CPU core"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Re-encode images that already have renditions"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Worker processes (default: CPU count)"
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            products = products.filter(image_renditions={})
+        jobs = list(products.values_list("id", "image"))
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS("Nothing to process."))
+            return
+
+        # Workers only touch storage; don't let them inherit open DB connections
+        connections.close_all()
+
+        processed, now = [], timezone.now()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+            for product_id, renditions, error in pool.map(_render, jobs, chunksize=4):
+                if error:
+                    self.stdout.write(self.style.WARNING(f"Product {product_id}: {error}"))
+                else:
+                    processed.append(Product(id=product_id, image_renditions=renditions, updated_at=now))
+
+        Product.objects.bulk_update(processed, ["image_renditions", "updated_at"], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(processed)} of {len(jobs)} image(s) with {options['workers']} worker(s)."
+        ))
@@ -0,0 +1,37 @@
+# shop/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Shop.models import Product, ProductSearchTerm
+from Shop.search import index_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search inverted index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Products indexed per batch"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == "postgresql":
+            # Rows written before the GIN index took over are never read; clear them
+            cleared, _ = ProductSearchTerm.objects.all().delete()
+            self.stdout.write(
+                f"PostgreSQL searches its GIN index; cleared {cleared} unused inverted-index row(s)."
+            )
+            return
+        batch_size = options["batch_size"]
+        products = Product.objects.only("id", "name", "category", "description").order_by("id")
+
+        total, last_id = 0, 0
+        while True:
+            batch = list(products.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            index_products(batch)
+            total += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} product(s)."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0005_auditlog_order_order_last_modified_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action_type',
+            field=models.CharField(choices=[('order_create', 'Order Created'), ('order_status_update', 'Order Status Updated'), ('order_cancel', 'Order Cancelled'), ('payment_reconcile', 'Payment Reconciled'), ('other', 'Other Action')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1 on 2026-10-19 15:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def blank_null_sizes(apps, schema_editor):
+    # NULLs never conflict in a unique constraint, so "no size" is stored as ""
+    ProductVariant = apps.get_model('Shop', 'ProductVariant')
+    ProductVariant.objects.filter(size__isnull=True).update(size='')
+
+
+def _suffixed(value, suffix, max_length):
+    return (value[:max_length - len(suffix)] + suffix).strip()
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    Make the new unique keys hold on existing data: of products sharing a name, and of
+    variants sharing a product and size, the oldest keeps its value and the others get
+    their id appended. Nothing is merged, so order items keep pointing at what was sold.
+    """
+    Product = apps.get_model('Shop', 'Product')
+    ProductVariant = apps.get_model('Shop', 'ProductVariant')
+
+    names = Product.objects.values('name').annotate(n=Count('id')).filter(n__gt=1).values_list('name', flat=True)
+    for name in list(names):
+        for product in Product.objects.filter(name=name).order_by('id')[1:]:
+            product.name = _suffixed(name, f' (#{product.id})', 255)
+            product.save(update_fields=['name'])
+
+    keys = ProductVariant.objects.values('product_id', 'size').annotate(n=Count('id')).filter(n__gt=1)
+    for key in list(keys):
+        variants = ProductVariant.objects.filter(product_id=key['product_id'], size=key['size']).order_by('id')
+        for variant in variants[1:]:
+            variant.size = _suffixed(key['size'], f' (#{variant.id})', 50)
+            variant.save(update_fields=['size'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0006_auditlog_payment_reconcile'),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_null_sizes, migrations.RunPython.noop),
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='size',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='productvariant',
+            constraint=models.UniqueConstraint(fields=('product', 'size'), name='unique_variant_size_per_product'),
+        ),
+    ]
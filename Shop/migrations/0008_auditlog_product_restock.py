@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-19 15:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0007_catalog_upsert_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entries', to='Shop.product'),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action_type',
+            field=models.CharField(choices=[('order_create', 'Order Created'), ('order_status_update', 'Order Status Updated'), ('order_cancel', 'Order Cancelled'), ('payment_reconcile', 'Payment Reconciled'), ('product_restock', 'Product Restocked'), ('other', 'Other Action')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1 on 2026-10-19 15:15
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+GIN_INDEX_NAME = 'product_search_gin'
+
+# Frozen copy of Shop.search.build_terms as of this migration
+FIELD_WEIGHTS = {'name': 3, 'category': 2, 'description': 1}
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _stem(word):
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def build_terms(name, category, description):
+    terms = {}
+    for field, text in (('name', name), ('category', category), ('description', description)):
+        for word in TOKEN_RE.findall((text or '').lower()):
+            if word not in STOP_WORDS:
+                term = _stem(word)[:64]
+                terms[term] = max(terms.get(term, 0), FIELD_WEIGHTS[field])
+    return terms
+
+
+def index_existing_products(apps, schema_editor):
+    # PostgreSQL searches the GIN index below instead
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    Product = apps.get_model('Shop', 'Product')
+    ProductSearchTerm = apps.get_model('Shop', 'ProductSearchTerm')
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for product in Product.objects.only('name', 'category', 'description').iterator()
+            for term, weight in build_terms(product.name, product.category, product.description).items()
+        ],
+        batch_size=1000,
+    )
+
+
+def _gin_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Must match Shop.search.search_vector() exactly for the planner to use it
+    return GinIndex(
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('category', weight='B', config='english')
+        + SearchVector('description', weight='C', config='english'),
+        name=GIN_INDEX_NAME,
+    )
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('Shop', 'Product'), _gin_index())
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('Shop', 'Product'), _gin_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0008_auditlog_product_restock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='Shop.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'product'), name='unique_search_term_per_product')],
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-19 15:16
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+# Frozen copy of Shop.search.PRICE_BANDS as of this migration
+PRICE_BANDS = [
+    ('0-499', 0, 500),
+    ('500-999', 500, 1000),
+    ('1000-4999', 1000, 5000),
+    ('5000+', 5000, None),
+]
+
+
+def populate_facets(apps, schema_editor):
+    Product = apps.get_model('Shop', 'Product')
+    ProductVariant = apps.get_model('Shop', 'ProductVariant')
+    CatalogFacet = apps.get_model('Shop', 'CatalogFacet')
+
+    facets = [
+        CatalogFacet(kind='category', value=row['category'], count=row['count'])
+        for row in Product.objects.values('category').annotate(count=Count('id'))
+    ]
+    for label, low, high in PRICE_BANDS:
+        band = Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high)
+        facets.append(CatalogFacet(kind='price_band', value=label, count=ProductVariant.objects.filter(band).count()))
+    CatalogFacet.objects.bulk_create(facets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0009_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Products per category'), ('price_band', 'Variants per price band')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'value'), name='unique_catalog_facet')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
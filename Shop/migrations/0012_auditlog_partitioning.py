@@ -0,0 +1,123 @@
+# Generated by Django 5.1 on 2026-10-19 15:40
+
+import re
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen from Shop.audit_partitions as of this migration
+TABLE = 'Shop_auditlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+MONTHS_AHEAD = 3
+
+
+def _month_start(value):
+    value = timezone.localtime(value)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.get_current_timezone())
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_month_partitions(cursor, quote, start):
+    """One partition per month from `start` (default: this month) to MONTHS_AHEAD ahead."""
+    month = _month_start(start or timezone.now())
+    last = _add_months(_month_start(timezone.now()), MONTHS_AHEAD)
+    while month <= last:
+        cursor.execute(
+            f'CREATE TABLE {quote(f"{TABLE}_p{month:%Y%m}")} PARTITION OF {quote(TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month, _add_months(month, 1)],
+        )
+        month = _add_months(month, 1)
+
+
+def _table_ddl(cursor, table):
+    """Primary key name, foreign keys and secondary indexes of `table` (a quoted name)."""
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [table],
+    )
+    primary_key = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary",
+        [table],
+    )
+    indexes = cursor.fetchall()
+    return primary_key, foreign_keys, indexes
+
+
+def _rebuild(schema_editor, partitioned):
+    """Swap the audit table for a (non-)partitioned copy with the same rows, keys and indexes."""
+    quote = schema_editor.quote_name
+    old = f'{TABLE}_old'
+    with schema_editor.connection.cursor() as cursor:
+        primary_key, foreign_keys, indexes = _table_ddl(cursor, quote(TABLE))
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}')
+        cursor.execute(f'ALTER TABLE {quote(old)} RENAME CONSTRAINT {quote(primary_key)} TO {quote(old + "_pkey")}')
+        # id is created plain and made an identity column again once the old table (and
+        # its identity sequence) is gone, so the new sequence takes over the same name
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old)} INCLUDING DEFAULTS)'
+            + (' PARTITION BY RANGE (created_at)' if partitioned else '')
+        )
+        # A partitioned table's primary key has to include the partition key
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(TABLE + "_pkey")} PRIMARY KEY '
+            + ('(id, created_at)' if partitioned else '(id)')
+        )
+
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+            cursor.execute(f'SELECT MIN(created_at) FROM {quote(old)}')
+            _create_month_partitions(cursor, quote, cursor.fetchone()[0])
+
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)} CASCADE')
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {quote(TABLE)}), 0) + 1, false)",
+            [quote(TABLE)],
+        )
+        for name, definition in indexes:
+            cursor.execute(re.sub(r' ON (ONLY )?\S+ USING ', f' ON {quote(TABLE)} USING ', definition, count=1))
+        # Added last: the copy would otherwise queue deferred FK checks, which block CREATE INDEX
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}')
+
+
+def partition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0011_product_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at'], name='auditlog_created_idx'),
+        ),
+        migrations.RunPython(partition_audit_log, unpartition_audit_log),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1 on 2026-10-19 15:24
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Patterns of the descriptions written before the structured fields existed
+STATUS_CHANGE = re.compile(r"Status changed from '(\w+)' to '(\w+)'")
+CANCELLED = re.compile(r"Order explicitly cancelled \(from status '(\w+)'\)")
+RECONCILED = re.compile(r"Payment #(\d+) reconciled from '(\w+)' to '(\w+)'")
+RESTOCKED = re.compile(r"by (-?\d+)\. New stock: (\d+)")
+
+
+def _parse(entry):
+    description = entry.description or ''
+    if match := STATUS_CHANGE.search(description):
+        entry.old_status, entry.new_status = match.groups()
+    elif match := CANCELLED.search(description):
+        entry.old_status, entry.new_status = match.group(1), 'cancelled'
+    elif match := RECONCILED.search(description):
+        entry.payload = {'payment_id': int(match.group(1))}
+        entry.old_status, entry.new_status = match.group(2), match.group(3)
+    elif entry.action_type == 'product_restock' and (match := RESTOCKED.search(description)):
+        entry.quantity_delta = int(match.group(1))
+        entry.payload = {'new_stock': int(match.group(2))}
+    else:
+        return False
+    return True
+
+
+def backfill_structured_fields(apps, schema_editor):
+    AuditLog = apps.get_model('Shop', 'AuditLog')
+    entries = AuditLog.objects.exclude(action_type__in=['order_create', 'other']).only(
+        'action_type', 'description'
+    )
+    batch = []
+    for entry in entries.iterator(chunk_size=2000):
+        if _parse(entry):
+            batch.append(entry)
+        if len(batch) >= 1000:
+            AuditLog.objects.bulk_update(batch, ['old_status', 'new_status', 'quantity_delta', 'payload'])
+            batch = []
+    if batch:
+        AuditLog.objects.bulk_update(batch, ['old_status', 'new_status', 'quantity_delta', 'payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0012_auditlog_partitioning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='new_status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='old_status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='quantity_delta',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entries', to='Shop.productvariant'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['order', '-created_at'], name='auditlog_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', '-created_at'], name='auditlog_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action_type', '-created_at'], name='auditlog_action_created_idx'),
+        ),
+        migrations.RunPython(backfill_structured_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1 on 2026-10-19 15:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_orders(apps, schema_editor):
+    Order = apps.get_model('Shop', 'Order')
+    ChangeCounter = apps.get_model('Shop', 'ChangeCounter')
+    # Existing orders enter the feed in id order, dated by when they were created
+    Order.objects.update(change_seq=F('id'), updated_at=F('created_at'))
+    ChangeCounter.objects.create(name='orders', value=Order.objects.aggregate(last=Max('id'))['last'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Shop', '0013_auditlog_structured_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField(null=True)),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['change_seq'], name='order_change_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'change_seq'], name='order_user_change_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertombstone',
+            index=models.Index(fields=['change_seq'], name='tombstone_change_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertombstone',
+            index=models.Index(fields=['user_id', 'change_seq'], name='tombstone_user_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_orders, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,18 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.conf import settings
 
 # --- EXISTING MODELS ---
 
 class Product(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     category = models.CharField(max_length=100)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Resized JPEG/WebP copies of `image`, see Shop.images
+    image_renditions = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also set by the bulk/queryset updates in inventory, catalog_import and images; feeds ETags
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -16,14 +20,90 @@ class Product(models.Model):
 
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, related_name="variants", on_delete=models.CASCADE)
-    size = models.CharField(max_length=50, blank=True, null=True)
+    size = models.CharField(max_length=50, blank=True, default="")
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Catalog imports upsert variants on (product, size)
+            models.UniqueConstraint(fields=["product", "size"], name="unique_variant_size_per_product"),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.size or 'No Size'}"
 
 
+class ProductSearchTerm(models.Model):
+    """Inverted index row: one (term, product) pair with the weight of the best field it came from."""
+    product = models.ForeignKey(Product, related_name="search_terms", on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["term", "product"], name="unique_search_term_per_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class CatalogFacet(models.Model):
+    """Precomputed facet count, maintained incrementally by Shop.facets."""
+    KIND_CHOICES = [
+        ("category", "Products per category"),
+        ("price_band", "Variants per price band"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "value"], name="unique_catalog_facet"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}={self.value}: {self.count}"
+
+
+class ChangeCounter(models.Model):
+    """Named monotonic counter; ORDERS numbers the order change feed (see Shop.changefeed)."""
+    ORDERS = "orders"
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next(cls, name, using=None):
+        """
+        Bump the counter and return the new value, in one UPDATE ... RETURNING. Call it late
+        in the writing transaction: the row stays locked until commit (so values become
+        visible in increasing order), and every other writer waits for it that long.
+        """
+        using = using or router.db_for_write(cls)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(cls._meta.db_table)} SET {quote('value')} = {quote('value')} + 1 "
+                f"WHERE {quote('name')} = %s RETURNING {quote('value')}",
+                [name],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            # Only for a counter never used before (0014 creates ORDERS)
+            cls.objects.using(using).get_or_create(name=name)
+            return cls.next(name, using)
+        return row[0]
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -49,10 +129,47 @@ class Order(models.Model):
         verbose_name="Last Handler"
     )
 
+    # Change feed position: bumped on every write, see Shop.changefeed
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_seq"], name="order_change_seq_idx"),
+            models.Index(fields=["user", "change_seq"], name="order_user_change_seq_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            # Written by the same INSERT / UPDATE as the rest of the row; the counter stays
+            # locked until this transaction commits
+            self.change_seq = ChangeCounter.next(ChangeCounter.ORDERS, using=using)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at", "change_seq"}
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order #{self.pk} by {self.user}"
 
 
+class OrderTombstone(models.Model):
+    """Left behind by a deleted order so change feed clients can drop it too."""
+    order_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True)
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_seq"], name="tombstone_change_seq_idx"),
+            models.Index(fields=["user_id", "change_seq"], name="tombstone_user_seq_idx"),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} deleted at seq {self.change_seq}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
@@ -67,6 +184,8 @@ class AuditLog(models.Model):
         ("order_create", "Order Created"),
         ("order_status_update", "Order Status Updated"), # Specific action type
         ("order_cancel", "Order Cancelled"),             # Specific action type
+        ("payment_reconcile", "Payment Reconciled"),
+        ("product_restock", "Product Restocked"),
         ("other", "Other Action"),
     ]
     
@@ -81,11 +200,30 @@ class AuditLog(models.Model):
     
     # 🟢 NEW: Link the log directly to the Order (Optional but helpful)
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="audit_entries")
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="audit_entries")
     
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, related_name="audit_entries")
+
+    # Structured change details; description stays as the human-readable summary
+    old_status = models.CharField(max_length=20, blank=True, default="")
+    new_status = models.CharField(max_length=20, blank=True, default="")
+    quantity_delta = models.IntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+
     # Updated description to be specific
     description = models.TextField(blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # On PostgreSQL the table is also partitioned by month on created_at (see Shop.audit_partitions).
+        # Each filter of the audit log endpoint has an index that also serves the newest-first ordering.
+        indexes = [
+            models.Index(fields=["created_at"], name="auditlog_created_idx"),
+            models.Index(fields=["order", "-created_at"], name="auditlog_order_created_idx"),
+            models.Index(fields=["user", "-created_at"], name="auditlog_user_created_idx"),
+            models.Index(fields=["action_type", "-created_at"], name="auditlog_action_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.action_type} on Order {self.order_id} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -0,0 +1,196 @@
+# shop/search.py
+"""
+Catalog search.
+
+On PostgreSQL, ranking uses a weighted tsvector over name/category/description, served
+by a GIN expression index (migration 0009), and ProductSearchTerm stays empty. Other
+databases (SQLite in tests) use that inverted index, which is kept up to date by signals
+and the importer.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Count, Exists, Min, OuterRef, Q, Subquery, Sum
+
+from .models import Product, ProductSearchTerm, ProductVariant
+
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+
+STOP_WORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+# (label, lower bound inclusive, upper bound exclusive) in KES
+PRICE_BANDS = [
+    ("0-499", 0, 500),
+    ("500-999", 500, 1000),
+    ("1000-4999", 1000, 5000),
+    ("5000+", 5000, None),
+]
+
+SORTS = {"relevance", "price", "-price", "name", "-created_at"}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    # Cheap plural folding so "palms" finds "palm"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [
+        _stem(word) for word in TOKEN_RE.findall((text or "").lower())
+        if word not in STOP_WORDS
+    ]
+
+
+def build_terms(name, category, description):
+    """term -> weight for one product, taking the strongest field each term appears in."""
+    terms = {}
+    for field, text in (("name", name), ("category", category), ("description", description)):
+        for term in tokenize(text):
+            terms[term[:64]] = max(terms.get(term[:64], 0), FIELD_WEIGHTS[field])
+    return terms
+
+
+def index_products(products):
+    """(Re)build inverted-index rows for the given products; PostgreSQL needs none."""
+    products = list(products)
+    if not products or connection.vendor == "postgresql":
+        return
+    ProductSearchTerm.objects.filter(product__in=[p.pk for p in products]).delete()
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for product in products
+            for term, weight in build_terms(product.name, product.category, product.description).items()
+        ],
+        batch_size=1000,
+    )
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector("name", weight="A", config="english")
+        + SearchVector("category", weight="B", config="english")
+        + SearchVector("description", weight="C", config="english")
+    )
+
+
+def _match(queryset, query):
+    """Restrict `queryset` to products matching every query term and annotate `rank`."""
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config="english", search_type="websearch")
+        return (
+            queryset.annotate(document=search_vector())
+            .filter(document=search_query)
+            .annotate(rank=SearchRank(search_vector(), search_query))
+        )
+
+    terms = set(tokenize(query))
+    scores = (
+        ProductSearchTerm.objects.filter(product=OuterRef("pk"), term__in=terms)
+        .values("product")
+        .annotate(score=Sum("weight"), matched=Count("term"))
+    )
+    return (
+        queryset.annotate(
+            rank=Subquery(scores.values("score")),
+            matched=Subquery(scores.values("matched")),
+        )
+        .filter(matched=len(terms))
+    )
+
+
+def price_band_filter(band, prefix=""):
+    _, low, high = band
+    conditions = Q(**{f"{prefix}price__gte": low})
+    if high is not None:
+        conditions &= Q(**{f"{prefix}price__lt": high})
+    return conditions
+
+
+def search_products(query="", category=None, min_price=None, max_price=None, in_stock=False, sort="relevance"):
+    """
+    Return (results queryset, facets).
+
+    Facets are computed over the text match (and stock filter) before the category and
+    price filters, so the counts show what the other choices would return.
+    """
+    products = Product.objects.all()
+    has_query = bool(tokenize(query))
+    if has_query:
+        products = _match(products, query)
+
+    variant_conditions = {}
+    if in_stock:
+        variant_conditions["stock__gt"] = 0
+        products = products.filter(
+            Exists(ProductVariant.objects.filter(product=OuterRef("pk"), stock__gt=0))
+        )
+
+    if has_query or in_stock:
+        facets = compute_facets(products, variant_conditions)
+    else:
+        # Whole-catalog facets come from the precomputed table
+        from .facets import facet_counts
+        facets = facet_counts()
+
+    if category:
+        products = products.filter(category=category)
+    if min_price is not None:
+        variant_conditions["price__gte"] = min_price
+    if max_price is not None:
+        variant_conditions["price__lte"] = max_price
+    if min_price is not None or max_price is not None:
+        products = products.filter(
+            Exists(ProductVariant.objects.filter(product=OuterRef("pk"), **variant_conditions))
+        )
+
+    # The displayed price is the cheapest variant that satisfies the filters
+    price_filter = Q(**{f"variants__{key}": value for key, value in variant_conditions.items()})
+    products = products.annotate(
+        min_price=Min("variants__price", filter=price_filter),
+        in_stock=Exists(ProductVariant.objects.filter(product=OuterRef("pk"), stock__gt=0)),
+    )
+
+    if sort == "price":
+        products = products.order_by("min_price", "id")
+    elif sort == "-price":
+        products = products.order_by("-min_price", "id")
+    elif sort == "relevance" and has_query:
+        products = products.order_by("-rank", "id")
+    elif sort == "name":
+        products = products.order_by("name")
+    else:
+        products = products.order_by("-created_at", "id")
+
+    return products, facets
+
+
+def compute_facets(products, variant_conditions=None):
+    """Product counts per category and variant counts per price band for `products`."""
+    matched = Product.objects.filter(pk__in=products.order_by().values("pk"))
+    categories = (
+        matched.values("category")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category")
+    )
+    bands = ProductVariant.objects.filter(
+        product__in=matched, **(variant_conditions or {})
+    ).aggregate(**{
+        f"band_{index}": Count("id", filter=price_band_filter(band))
+        for index, band in enumerate(PRICE_BANDS)
+    })
+    return {
+        "category": [{"value": row["category"], "count": row["count"]} for row in categories],
+        "price_band": [
+            {"value": band[0], "count": bands[f"band_{index}"]}
+            for index, band in enumerate(PRICE_BANDS)
+        ],
+    }
@@ -1,6 +1,11 @@
+from datetime import datetime, time, timedelta
+
+from django.utils.dateparse import parse_date
 from rest_framework import serializers
 from .models import Product, ProductVariant, Order, OrderItem, AuditLog
 from django.contrib.auth import get_user_model
+from .search import SORTS
+from .images import srcset
 
 User = get_user_model()
 
@@ -24,6 +29,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     variants = ProductVariantSerializer(many=True, read_only=True)
     price = serializers.SerializerMethodField()  # lowest variant price
+    image_srcset = serializers.SerializerMethodField()  # {"jpeg": "<url> 320w, ...", "webp": ...}
 
     class Meta:
         model = Product
@@ -33,6 +39,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "description",
             "category",
             "image",
+            "image_srcset",
             "variants",
             "price",         # added here
             "created_at",
@@ -44,6 +51,10 @@ class ProductSerializer(serializers.ModelSerializer):
             return 0.0
         return float(min(v.price or 0 for v in variants))
 
+    def get_image_srcset(self, obj):
+        request = self.context.get("request")
+        return srcset(obj.image_renditions, request.build_absolute_uri if request else str)
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     variant = ProductVariantSerializer(read_only=True)
@@ -73,8 +84,9 @@ class OrderSerializer(serializers.ModelSerializer):
             (item.variant.price or 0) * item.quantity
             for item in order.items.all()
         )
-        order.total_price = total
-        order.save(update_fields=["total_price"])
+        if order.total_price != total:
+            order.total_price = total
+            order.save(update_fields=["total_price"])
         return order
 
     def create(self, validated_data):
@@ -118,6 +130,77 @@ class RestockSerializer(serializers.Serializer):
     amount = serializers.IntegerField(min_value=1)
 
 
+class BulkRestockSerializer(serializers.Serializer):
+    items = serializers.ListField(child=RestockSerializer(), allow_empty=False, max_length=20000)
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    """Validates the query parameters of the catalog search endpoint."""
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    category = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    in_stock = serializers.BooleanField(required=False, default=False)
+    sort = serializers.ChoiceField(choices=sorted(SORTS), required=False, default="relevance")
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=24)
+    offset = serializers.IntegerField(required=False, min_value=0, default=0)
+
+
+class ChangeFeedSerializer(serializers.Serializer):
+    """Validates the query parameters of the order change feed."""
+    since = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=200)
+
+
+class WindowStartField(serializers.DateTimeField):
+    """An ISO datetime, or a date standing for the start of that day."""
+    days_after = 0
+
+    def to_internal_value(self, value):
+        try:
+            day = parse_date(value) if isinstance(value, str) else None
+        except ValueError:  # well-formed but impossible, e.g. 2026-02-30
+            self.fail("invalid", format="YYYY-MM-DD, ISO 8601")
+        if day is not None:
+            value = datetime.combine(day + timedelta(days=self.days_after), time.min)
+        return super().to_internal_value(value)
+
+
+class WindowEndField(WindowStartField):
+    """An ISO datetime (exclusive), or a date standing for the end of that whole day."""
+    days_after = 1
+
+
+class DateWindowSerializer(serializers.Serializer):
+    """
+    ?start= / ?end= on created_at, shared by the audit log list and the admin exports.
+    Either may be a date or an ISO datetime; end=2026-03-31 includes all of March 31st.
+    """
+    start = WindowStartField(required=False, input_formats=["iso-8601"])
+    end = WindowEndField(required=False, input_formats=["iso-8601"])
+
+    def validate(self, attrs):
+        if attrs.get("start") and attrs.get("end") and attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError({"end": "Must be later than start."})
+        return attrs
+
+
+class AuditLogFilterSerializer(DateWindowSerializer):
+    """Validates the query parameters of the audit log list endpoint."""
+    order = serializers.IntegerField(required=False, min_value=1)
+    user = serializers.IntegerField(required=False, min_value=1)
+    action_type = serializers.ChoiceField(choices=AuditLog.ACTION_CHOICES, required=False)
+    # Earlier name of ?start=, still accepted
+    since = WindowStartField(required=False, input_formats=["iso-8601"])
+
+    def validate(self, attrs):
+        if "since" in attrs:
+            if "start" in attrs:
+                raise serializers.ValidationError({"since": "Use start or since, not both."})
+            attrs["start"] = attrs.pop("since")
+        return super().validate(attrs)
+
+
 class AuditLogSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
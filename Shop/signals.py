@@ -0,0 +1,113 @@
+# shop/signals.py
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .facets import bump, price_band
+from .images import render_renditions
+from .models import ChangeCounter, Order, OrderTombstone, Product, ProductVariant
+from .search import index_products
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_product(sender, instance, **kwargs):
+    """Stash the stored category/image so post_save handlers can tell what changed."""
+    previous = (
+        Product.objects.filter(pk=instance.pk).values("category", "image").first()
+        if instance.pk else None
+    ) or {}
+    instance._previous_category = previous.get("category")
+    instance._previous_image = previous.get("image")
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    """Keep the search index in step with admin/API edits (bulk imports reindex themselves)."""
+    index_products([instance])
+
+
+@receiver(post_save, sender=Product)
+def process_uploaded_image(sender, instance, **kwargs):
+    """
+    Drop the renditions of a replaced or cleared image, and render the new one once the
+    upload is committed.
+
+    The save has already succeeded by then, so an image Pillow cannot read is logged and
+    left without renditions (serializers fall back to the original) instead of failing
+    the request; `process_product_images` retries it.
+    """
+    image_name = instance.image.name if instance.image else None
+    if image_name == (getattr(instance, "_previous_image", None) or None):
+        return
+    Product.objects.filter(pk=instance.pk).exclude(image_renditions={}).update(image_renditions={})
+    if not image_name:
+        return
+
+    def render():
+        try:
+            renditions = render_renditions(image_name)
+        except Exception:
+            logger.warning("Could not render product %s image %s", instance.pk, image_name, exc_info=True)
+            return
+        # Skip if the image was replaced again in the meantime
+        Product.objects.filter(pk=instance.pk, image=image_name).update(
+            image_renditions=renditions, updated_at=timezone.now()
+        )
+
+    transaction.on_commit(render, robust=True)
+
+
+# --- Facet counts: apply the delta between the stored and the saved value ---
+
+@receiver(post_save, sender=Product)
+def update_category_facet(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_category", None)
+    if created or previous is None:
+        bump("category", instance.category, 1)
+    elif previous != instance.category:
+        bump("category", previous, -1)
+        bump("category", instance.category, 1)
+
+
+@receiver(post_delete, sender=Product)
+def remove_category_facet(sender, instance, **kwargs):
+    bump("category", instance.category, -1)
+
+
+@receiver(pre_save, sender=ProductVariant)
+def remember_variant_band(sender, instance, **kwargs):
+    previous_price = (
+        ProductVariant.objects.filter(pk=instance.pk).values_list("price", flat=True).first()
+        if instance.pk else None
+    )
+    instance._previous_band = price_band(previous_price)
+
+
+@receiver(post_save, sender=ProductVariant)
+def update_price_band_facet(sender, instance, created, **kwargs):
+    previous, current = getattr(instance, "_previous_band", None), price_band(instance.price)
+    if created or previous is None:
+        bump("price_band", current, 1)
+    elif previous != current:
+        bump("price_band", previous, -1)
+        bump("price_band", current, 1)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def remove_price_band_facet(sender, instance, **kwargs):
+    bump("price_band", price_band(instance.price), -1)
+
+
+@receiver(post_delete, sender=Order)
+def leave_order_tombstone(sender, instance, **kwargs):
+    """Deleted orders stay visible to the change feed as a tombstone."""
+    OrderTombstone.objects.create(
+        order_id=instance.pk,
+        user_id=instance.user_id,
+        change_seq=ChangeCounter.next(ChangeCounter.ORDERS),
+    )
@@ -0,0 +1,196 @@
+# shop/state_machine.py
+"""
+Order state machine.
+
+Every order status change goes through `transition()` / `transition_many()`. A change is
+a conditional UPDATE ... WHERE status=<expected>, so two writers racing on the same order
+cannot both win and no row locks are needed: the loser updates 0 rows and gets
+TransitionConflict. Side effects (stock, payments) are hooks registered per transition
+and run in the same transaction, so a failing hook rolls the status change back.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from BackEnd import events, metrics
+
+from . import audit
+from .changefeed import stamp
+from .models import AuditLog, Order, OrderItem, ProductVariant
+
+# status -> statuses it may move to
+TRANSITIONS = {
+    "pending": {"paid", "processing", "completed", "cancelled"},
+    "paid": {"pending", "processing", "shipped", "completed", "cancelled"},
+    "processing": {"shipped", "completed", "cancelled"},
+    "shipped": {"completed", "cancelled"},
+    "completed": set(),
+    "cancelled": set(),
+}
+
+
+class InvalidTransition(Exception):
+    """The requested change is not allowed from the order's current status."""
+
+
+class TransitionConflict(InvalidTransition):
+    """The order's status changed underneath us (a concurrent transition won)."""
+
+
+class InsufficientStock(InvalidTransition):
+    pass
+
+
+_hooks = defaultdict(list)
+
+
+def on_transition(target, source="*"):
+    """Register `func(order_id, source, target, user)` to run inside matching transitions."""
+    def register(func):
+        _hooks[(source, target)].append(func)
+        return func
+    return register
+
+
+def can_transition(source, target):
+    return target in TRANSITIONS.get(source, ())
+
+
+def sources_for(target):
+    return [source for source, targets in TRANSITIONS.items() if target in targets]
+
+
+def _run_hooks(order_id, source, target, user):
+    for func in _hooks[(source, target)] + _hooks[("*", target)]:
+        func(order_id, source, target, user)
+
+
+def _audit(order_id, source, target, user, action_type, description):
+    return AuditLog(
+        user=user,
+        order_id=order_id,
+        action_type=action_type,
+        old_status=source,
+        new_status=target,
+        description=description or (
+            f"Status changed from '{source}' to '{target}'."
+            + (f" Handled by: {user.username} (ID: {user.id})." if user else " Handled by: system.")
+        ),
+    )
+
+
+def _announce(order_id, source, target, change_seq):
+    events.publish(
+        events.ORDER_STATUS_CHANGED,
+        order_id=order_id, old_status=source, new_status=target, change_seq=change_seq,
+    )
+
+
+def transition(order, target, user=None, action_type="order_status_update", description=None):
+    """
+    Move one order from its (in-memory) status to `target`.
+
+    Raises InvalidTransition if the table forbids it and TransitionConflict if the stored
+    status no longer matches `order.status`. On success `order` is updated in place.
+    """
+    source = order.status
+    if not can_transition(source, target):
+        raise InvalidTransition(f"Cannot change order status from '{source}' to '{target}'.")
+
+    with audit.atomic():
+        updated = Order.objects.filter(pk=order.pk, status=source).update(status=target, last_modified_by=user)
+        if not updated:
+            metrics.ORDER_CONFLICTS.labels(target).inc()
+            raise TransitionConflict(
+                f"Order #{order.pk} is no longer '{source}'; it was changed by another request."
+            )
+        _run_hooks(order.pk, source, target, user)
+        audit.record_many([_audit(order.pk, source, target, user, action_type, description)])
+        _announce(order.pk, source, target, stamp([order.pk]))
+
+    order.status = target
+    order.last_modified_by = user
+    return order
+
+
+def transition_many(order_ids, target, user=None, sources=None):
+    """
+    Move many orders to `target` with set-based conditional UPDATEs.
+
+    Orders whose status is not an allowed source (optionally narrowed by `sources`) are
+    left alone. Returns the ids that actually transitioned.
+    """
+    allowed = set(sources_for(target))
+    if sources is not None:
+        allowed &= set(sources)
+
+    current = defaultdict(list)
+    for order_id, status in Order.objects.filter(id__in=list(order_ids), status__in=allowed).values_list("id", "status"):
+        current[status].append(order_id)
+
+    moved = []
+    with audit.atomic():
+        audit_entries = []
+        for source, ids in current.items():
+            changes = dict(status=target, last_modified_by=user)
+            savepoint = transaction.savepoint()
+            updated = Order.objects.filter(id__in=ids, status=source).update(**changes)
+            if updated == len(ids):
+                transaction.savepoint_commit(savepoint)
+            else:
+                # Someone else moved part of this group: undo and settle it order by order
+                transaction.savepoint_rollback(savepoint)
+                ids = [
+                    order_id for order_id in ids
+                    if Order.objects.filter(id=order_id, status=source).update(**changes)
+                ]
+            for order_id in ids:
+                _run_hooks(order_id, source, target, user)
+                audit_entries.append(_audit(order_id, source, target, user, "order_status_update", None))
+            moved.extend((order_id, source) for order_id in ids)
+        audit.record_many(audit_entries)
+        if moved:
+            change_seq = stamp([order_id for order_id, _ in moved])
+            for order_id, source in moved:
+                _announce(order_id, source, target, change_seq)
+    return [order_id for order_id, _ in moved]
+
+
+# --- Side effects ---
+
+@on_transition("completed")
+def deduct_stock(order_id, source, target, user):
+    """Take the ordered quantities out of stock; fails the transition if any variant runs short."""
+    quantities = defaultdict(int)
+    for variant_id, quantity in OrderItem.objects.filter(order_id=order_id).values_list("variant_id", "quantity"):
+        quantities[variant_id] += quantity
+
+    for variant_id, quantity in quantities.items():
+        # Conditional decrement: never lets stock go negative, no read-modify-write.
+        # Its time includes waiting for other orders holding the variant's row lock.
+        with metrics.STOCK_RESERVATION.time():
+            reserved = ProductVariant.objects.filter(pk=variant_id, stock__gte=quantity).update(
+                stock=F("stock") - quantity, updated_at=timezone.now()
+            )
+        if not reserved:
+            metrics.STOCK_SHORTAGES.inc()
+            variant = ProductVariant.objects.select_related("product").get(pk=variant_id)
+            raise InsufficientStock(
+                f"Not enough stock for {variant.product.name} ({variant.size}). "
+                f"Required: {quantity}, Available: {variant.stock}"
+            )
+    events.publish(
+        events.STOCK_CHANGED,
+        stock=dict(ProductVariant.objects.filter(id__in=list(quantities)).values_list("id", "stock")),
+    )
+
+
+@on_transition("cancelled")
+def cancel_pending_payments(order_id, source, target, user):
+    from Payment.models import Payment
+
+    Payment.objects.filter(order_id=order_id, status="pending").update(
+        status="cancelled", result_desc="Order cancelled", updated_at=timezone.now()
+    )
@@ -1,3 +1,652 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+from importlib import import_module
+from unittest import mock, skipUnless
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from asgiref.testing import ApplicationCommunicator
+from PIL import Image
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Auth.models import CustomUser
+from BackEnd import events
+from BackEnd.websocket import websocket_application
+from . import audit
+from .catalog_import import import_catalog, read_rows
+from .audit_partitions import expire_month, expired_months, month_start, retention_cutoff
+from .inventory import restock_variants
+from .fast_serializers import order_list, product_list
+from .serializers import OrderSerializer, ProductSerializer
+from .models import AuditLog, CatalogFacet, Order, OrderItem, Product, ProductSearchTerm, ProductVariant
+from .facets import facet_counts, find_mismatches, rebuild_facets
+from .search import build_terms, search_products
+from .state_machine import InvalidTransition, TransitionConflict, transition, transition_many
+
+
+def make_order(user, variant, quantity=1, status="pending"):
+    order = Order.objects.create(user=user, status=status)
+    OrderItem.objects.create(order=order, variant=variant, quantity=quantity)
+    return order
+
+
+class OrderStateMachineTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+
+    def test_completion_deducts_stock_and_audits(self):
+        order = make_order(self.user, self.variant, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(order, "completed", user=self.user)
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "completed")
+        self.assertTrue(AuditLog.objects.filter(order=order, action_type="order_status_update").exists())
+
+    def test_change_counter_is_taken_last(self):
+        order = make_order(self.user, self.variant, quantity=2)
+        with CaptureQueriesContext(connection) as queries:
+            transition(order, "completed", user=self.user)
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertIn("shop_productvariant", updates[1].lower())
+        self.assertIn("shop_changecounter", updates[2].lower())
+        self.assertEqual(Order.objects.get(pk=order.pk).change_seq, order.change_seq + 1)
+
+    def test_insufficient_stock_rolls_back(self):
+        order = make_order(self.user, self.variant, quantity=5)
+        with self.assertRaises(InvalidTransition):
+            transition(order, "completed", user=self.user)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "pending")
+
+    def test_forbidden_transition(self):
+        order = make_order(self.user, self.variant, status="cancelled")
+        with self.assertRaises(InvalidTransition):
+            transition(order, "completed", user=self.user)
+
+    def test_stale_status_is_a_conflict(self):
+        order = make_order(self.user, self.variant)
+        stale = Order.objects.get(pk=order.pk)
+        transition(order, "paid", user=self.user)
+        with self.assertRaises(TransitionConflict):
+            transition(stale, "cancelled", user=self.user)
+
+    def test_transition_many_skips_disallowed_sources(self):
+        pending = make_order(self.user, self.variant)
+        shipped = make_order(self.user, self.variant, status="shipped")
+        moved = transition_many([pending.pk, shipped.pk], "paid", sources=["pending"])
+        self.assertEqual(moved, [pending.pk])
+        self.assertEqual(Order.objects.get(pk=shipped.pk).status, "shipped")
+
+
+class RestockTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.small = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        self.large = ProductVariant.objects.create(product=product, size="20L", price=1500, stock=0)
+
+    def test_restock_sums_repeats_and_audits_each_variant(self):
+        new_stock, missing = restock_variants(
+            [(self.small.pk, 2), (self.large.pk, 4), (self.small.pk, 5)], self.staff
+        )
+        self.assertEqual(new_stock, {self.small.pk: 10, self.large.pk: 4})
+        self.assertEqual(missing, [])
+        self.assertEqual(ProductVariant.objects.get(pk=self.small.pk).stock, 10)
+        audits = AuditLog.objects.filter(action_type="product_restock")
+        self.assertEqual(
+            sorted(audits.values_list("variant_id", "quantity_delta")),
+            sorted([(self.small.pk, 7), (self.large.pk, 4)]),
+        )
+
+    def test_unknown_and_deleted_variants_are_skipped(self):
+        gone = self.large.pk
+        self.large.delete()
+        new_stock, missing = restock_variants([(self.small.pk, 1), (gone, 3), (999999, 2)], self.staff)
+        self.assertEqual(new_stock, {self.small.pk: 4})
+        self.assertEqual(missing, [gone, 999999])
+        self.assertEqual(
+            list(AuditLog.objects.values_list("variant_id", flat=True)), [self.small.pk]
+        )
+
+    def test_bulk_restock_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.post("/api/shop/products/bulk-restock/", {"items": [
+            {"variant_id": self.small.pk, "amount": 2},
+            {"variant_id": self.large.pk, "amount": 6},
+            {"variant_id": 999999, "amount": 1},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            sorted((row["variant_id"], row["stock"]) for row in body["new_stock"]),
+            sorted([(self.small.pk, 5), (self.large.pk, 6)]),
+        )
+        self.assertEqual(body["missing_variant_ids"], [999999])
+        self.assertEqual(AuditLog.objects.filter(action_type="product_restock").count(), 2)
+
+        client.force_authenticate(CustomUser.objects.create_user(
+            "buyer@example.com", "buyer", "Buy", "Er", "pw", user_type="customer"
+        ))
+        response = client.post("/api/shop/products/bulk-restock/", {"items": [
+            {"variant_id": self.small.pk, "amount": 2},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(ProductVariant.objects.get(pk=self.small.pk).stock, 5)
+
+
+class AuditWriterTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+
+    def test_unit_of_work_writes_its_entries_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            with audit.atomic():
+                audit.record(user=self.user, action_type="order_create", description="one")
+                with audit.atomic():
+                    audit.record(user=self.user, action_type="order_create", description="two")
+                self.assertEqual(AuditLog.objects.count(), 0)
+        inserts = [query for query in queries.captured_queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+    def test_entries_are_written_inside_the_transaction(self):
+        with transaction.atomic():
+            audit.record(user=self.user, action_type="order_create", description="one")
+            self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_rolled_back_entries_are_dropped(self):
+        try:
+            with audit.atomic():
+                audit.record(user=self.user, action_type="order_create", description="lost")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with audit.atomic():
+            audit.record(user=self.user, action_type="order_create", description="kept")
+        self.assertEqual(list(AuditLog.objects.values_list("description", flat=True)), ["kept"])
+
+    def test_entries_of_a_rolled_back_savepoint_are_dropped(self):
+        with audit.atomic():
+            audit.record(user=self.user, action_type="order_create", description="outer")
+            for block in (transaction.atomic, audit.atomic):
+                try:
+                    with block():
+                        audit.record(user=self.user, action_type="order_create", description="inner")
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertEqual(list(AuditLog.objects.values_list("description", flat=True)), ["outer"])
+
+    def test_failing_audit_write_rolls_back_the_change(self):
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        order = make_order(self.user, variant)
+        with mock.patch.object(AuditLog.objects, "bulk_create", side_effect=OperationalError("disk full")):
+            with self.assertRaises(OperationalError):
+                transition(order, "paid", user=self.user)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "pending")
+        self.assertFalse(AuditLog.objects.exists())
+
+
+class AuditArchiveTests(TestCase):
+    def test_expired_month_is_archived_then_dropped(self):
+        old = AuditLog.objects.create(action_type="other", description="old")
+        AuditLog.objects.create(action_type="other", description="current")
+        AuditLog.objects.filter(pk=old.pk).update(created_at=datetime(2020, 3, 15, tzinfo=dt_timezone.utc))
+
+        months = expired_months(retention_cutoff(12))
+        self.assertEqual(months, [month_start(datetime(2020, 3, 1, tzinfo=dt_timezone.utc))])
+
+        with tempfile.TemporaryDirectory() as directory:
+            def fail_halfway(month, conn):
+                AuditLog.objects.filter(pk=old.pk).delete()
+                raise OperationalError("lock timeout")
+
+            with mock.patch("Shop.audit_partitions.drop_month", side_effect=fail_halfway):
+                with self.assertRaises(OperationalError):
+                    expire_month(months[0], directory)
+            self.assertEqual(AuditLog.objects.count(), 2)
+
+            path, count = expire_month(months[0], directory)
+            with gzip.open(path, "rt") as archive:
+                rows = [json.loads(line) for line in archive]
+
+        self.assertEqual(count, 1)
+        self.assertEqual([row["description"] for row in rows], ["old"])
+        self.assertEqual(list(AuditLog.objects.values_list("description", flat=True)), ["current"])
+
+
+class AuditLogQueryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_transitions_record_structured_fields(self):
+        order = make_order(self.user, self.variant)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(order, "paid", user=self.user)
+        entry = AuditLog.objects.get(order=order)
+        self.assertEqual((entry.old_status, entry.new_status), ("pending", "paid"))
+
+    def test_listing_is_unbounded_unless_a_start_is_given(self):
+        order = make_order(self.user, self.variant)
+        other = make_order(self.user, self.variant)
+        old = AuditLog.objects.create(order=order, action_type="order_create")
+        AuditLog.objects.create(order=other, action_type="order_create")
+        AuditLog.objects.filter(pk=old.pk).update(created_at=datetime(2020, 3, 15, tzinfo=dt_timezone.utc))
+
+        response = self.client.get("/api/shop/audit-logs/", {"order": order.pk})
+        self.assertEqual([row["id"] for row in response.json()], [old.pk])
+
+        response = self.client.get("/api/shop/audit-logs/", {"action_type": "order_create"})
+        self.assertEqual(len(response.json()), 2)
+
+        response = self.client.get("/api/shop/audit-logs/", {"action_type": "order_create", "start": "2021-01-01"})
+        self.assertEqual(len(response.json()), 1)
+        response = self.client.get("/api/shop/audit-logs/", {"action_type": "order_create", "since": "2020-01-01"})
+        self.assertEqual(len(response.json()), 2)
+
+        response = self.client.get("/api/shop/audit-logs/", {"start": "2020-03-20", "end": "2020-03-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderChangeFeedTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        self.customer = CustomUser.objects.create_user("jane@example.com", "jane", "Jane", "Doe", "pw")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        self.client = APIClient()
+
+    def feed(self, user, since):
+        self.client.force_authenticate(user)
+        return self.client.get("/api/shop/orders/changes/", {"since": since}).json()
+
+    def test_feed_returns_only_changes_after_cursor(self):
+        kept = make_order(self.customer, self.variant)
+        other = make_order(self.staff, self.variant)
+        cursor = self.feed(self.staff, 0)["cursor"]
+
+        transition(kept, "cancelled", user=self.staff)
+        other_id = other.pk
+        other.delete()
+
+        page = self.feed(self.staff, cursor)
+        self.assertEqual(
+            [(change["op"], change["order"]["id"]) for change in page["changes"]],
+            [("cancelled", kept.pk), ("deleted", other_id)],
+        )
+        self.assertFalse(page["has_more"])
+        self.assertEqual(self.feed(self.staff, page["cursor"])["changes"], [])
+
+        # Customers only see their own orders
+        self.assertEqual([c["order"]["id"] for c in self.feed(self.customer, cursor)["changes"]], [kept.pk])
+
+    def test_save_writes_the_seq_with_the_row(self):
+        order = make_order(self.customer, self.variant)
+        order.total_price = 500
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        statements = [
+            query["sql"].lower() for query in queries.captured_queries
+            if query["sql"].startswith(("SELECT", "INSERT", "UPDATE"))
+        ]
+        self.assertEqual(len(statements), 2)
+        self.assertIn("shop_changecounter", statements[0])
+        self.assertIn("returning", statements[0])
+        self.assertIn("change_seq", statements[1])
+        self.assertEqual(Order.objects.get(pk=order.pk).change_seq, order.change_seq)
+        self.assertEqual(make_order(self.customer, self.variant).change_seq, order.change_seq + 1)
+
+
+@override_settings(EVENTS_BACKEND="BackEnd.events.LocalBackend")
+class StaffEventTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        events.get_backend().events.clear()
+
+    def test_events_are_published_after_commit(self):
+        order = make_order(self.user, self.variant, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(order, "completed", user=self.user)
+            self.assertEqual(events.get_backend().events, [])
+
+        published = {event["type"]: event["data"] for event in events.get_backend().events}
+        self.assertEqual(published[events.ORDER_STATUS_CHANGED]["new_status"], "completed")
+        self.assertEqual(published[events.STOCK_CHANGED]["stock"], {self.variant.pk: 1})
+
+    def test_rolled_back_changes_are_not_published(self):
+        order = make_order(self.user, self.variant, quantity=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(InvalidTransition):
+                transition(order, "completed", user=self.user)
+        self.assertEqual(events.get_backend().events, [])
+
+
+
+# close_old_connections() would close the test case's transaction under the socket
+@mock.patch("django.db.close_old_connections")
+@override_settings(EVENTS_BACKEND="BackEnd.events.InProcessBackend")
+class StaffSocketTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        self.customer = CustomUser.objects.create_user("jane@example.com", "jane", "Jane", "Doe", "pw")
+
+    def token(self, user, seconds=300):
+        token = AccessToken.for_user(user)
+        token.set_exp(lifetime=timedelta(seconds=seconds))
+        return str(token)
+
+    def socket(self, subprotocols=(), query_string=b""):
+        return ApplicationCommunicator(websocket_application, {
+            "type": "websocket", "path": "/ws/staff/events/",
+            "query_string": query_string, "subprotocols": list(subprotocols),
+        })
+
+    async def test_token_in_the_query_string_is_not_accepted(self, close_old_connections):
+        socket = self.socket(query_string=f"token={self.token(self.staff)}".encode())
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.accept"})
+        await socket.send_input({"type": "websocket.receive", "text": "hello"})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.close", "code": 4403})
+
+    async def test_protocol_token_is_checked_before_the_handshake(self, close_old_connections):
+        socket = self.socket(["bearer", self.token(self.customer)])
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.close", "code": 4403})
+
+        socket = self.socket(["bearer", self.token(self.staff, seconds=1)])
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.accept", "subprotocol": "bearer"})
+        self.assertEqual(await socket.receive_output(timeout=3), {"type": "websocket.close", "code": 4401})
+
+    async def test_first_message_token_streams_events_until_expiry(self, close_old_connections):
+        socket = self.socket()
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.accept"})
+        await socket.send_input({"type": "websocket.receive", "text": json.dumps({"token": self.token(self.staff, 1)})})
+        await asyncio.sleep(0.1)  # let the socket subscribe
+        events.get_backend().publish({"type": "order.created", "data": {"order_id": 1}})
+        self.assertEqual(json.loads((await socket.receive_output())["text"])["data"], {"order_id": 1})
+
+        # A fresh token of the same user keeps the socket open past the first expiry
+        await socket.send_input({"type": "websocket.receive", "text": json.dumps({"token": self.token(self.staff, 3)})})
+        await asyncio.sleep(1.2)
+        self.assertTrue(await socket.receive_nothing())
+        self.assertEqual(await socket.receive_output(timeout=3), {"type": "websocket.close", "code": 4401})
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jane@example.com", "jane", "Jane", "Doe", "pw")
+        palm = Product.objects.create(name="Royal Palm", category="palms", image_renditions={})
+        self.variant = ProductVariant.objects.create(product=palm, size="5L", price=500, stock=3)
+        ProductVariant.objects.create(product=palm, size="10L", price=350, stock=0)
+        Product.objects.create(name="Seed Tray", category="tools")
+        order = make_order(self.user, self.variant, quantity=2)
+        OrderSerializer(context={"request": None})._recalculate_total(order)
+
+    def test_output_matches_model_serializers(self):
+        products = Product.objects.prefetch_related("variants").order_by("id")
+        self.assertEqual(product_list(products), ProductSerializer(products, many=True).data)
+
+        orders = Order.objects.prefetch_related("items__variant").order_by("id")
+        self.assertEqual(order_list(orders), OrderSerializer(orders, many=True).data)
+
+    def test_sparse_fields_prune_output_and_queries(self):
+        client = APIClient()
+        with self.assertNumQueries(2):  # ETag aggregate, then products with their min price
+            response = client.get("/api/shop/products/", {"fields": "name,price,image"})
+        self.assertEqual(
+            sorted(response.json(), key=lambda row: row["id"])[0],
+            {"id": self.variant.product_id, "name": "Royal Palm", "image": None, "price": 350.0},
+        )
+
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(3):  # ETag aggregate, orders, items without the variant join
+            response = client.get("/api/shop/orders/", {"fields": "items,status", "expand": "items"})
+        self.assertEqual(response.json()[0]["items"][0]["variant"], self.variant.pk)
+
+        response = client.get("/api/shop/products/", {"fields": "colour"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        for i in range(30):
+            product = Product.objects.create(name=f"Palm {i}", category="palms", description="Tall and green. " * 5)
+            self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        self.client = APIClient()
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get("/api/shop/products/")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            again = self.client.get("/api/shop/products/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        self.client.force_authenticate(self.staff)
+        restock_variants([(self.variant.pk, 5)], self.staff)
+        changed = self.client.get("/api/shop/products/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_deletions_and_embedded_users_change_the_etag(self):
+        first = self.client.get("/api/shop/products/")
+        self.assertFalse(first.has_header("Last-Modified"))
+        self.variant.delete()
+        self.assertEqual(self.client.get("/api/shop/products/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+        Order.objects.create(user=self.staff, status="pending", total_price=100)
+        self.client.force_authenticate(self.staff)
+        orders = self.client.get("/api/shop/orders/", {"expand": "user"})
+        self.staff.first_name = "Renamed"
+        self.staff.save()
+        renamed = self.client.get("/api/shop/orders/", {"expand": "user"}, HTTP_IF_NONE_MATCH=orders["ETag"])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()[0]["user"]["first_name"], "Renamed")
+
+    def test_large_responses_are_compressed(self):
+        response = self.client.get("/api/shop/products/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith("W/"))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 30)
+
+        small = self.client.get("/api/shop/products/", {"fields": "id", "limit": 1}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def upload(self, product, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            product.image = SimpleUploadedFile("palm.jpg", content)
+            product.save()
+        product.refresh_from_db()
+
+    def test_renditions_follow_the_image(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 200), "green").save(buffer, format="JPEG")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.upload(product, buffer.getvalue())
+        self.assertEqual(sorted(product.image_renditions, key=int), ["320", "400"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.image = None
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_renditions, {})
+
+    def test_unreadable_upload_is_saved_without_renditions(self):
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        with self.assertLogs("Shop.signals", "WARNING"):
+            self.upload(product, b"not an image")
+        self.assertTrue(product.image)
+        self.assertEqual(product.image_renditions, {})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.palm = Product.objects.create(name="Royal Palms", category="palms", description="Tall")
+        self.fern = Product.objects.create(name="Boston Fern", category="ferns", description="Grows under a palm")
+        Product.objects.create(name="Aloe", category="succulents", description="Spiky")
+
+    def test_search_ranks_name_matches_first(self):
+        products, facets = search_products("palm")
+        self.assertEqual([p.pk for p in products], [self.palm.pk, self.fern.pk])
+        self.assertEqual({row["value"] for row in facets["category"]}, {"palms", "ferns"})
+
+    def test_migration_builds_the_same_terms(self):
+        migration = import_module("Shop.migrations.0009_product_search_index")
+        for text in [("Royal Palms", "palms", "The glass of a fern and the moss"), ("", None, "A-1 x")]:
+            self.assertEqual(migration.build_terms(*text), build_terms(*text))
+
+    @skipUnless(connection.vendor == "postgresql", "the inverted index is only skipped on PostgreSQL")
+    def test_postgres_writes_no_search_terms(self):
+        self.assertFalse(ProductSearchTerm.objects.exists())
+
+
+class ConcurrentTransitionTests(TransactionTestCase):
+    """Conflicting transitions fired in parallel: exactly one wins, side effects run once."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("staff@example.com", "staff", "Staff", "User", "pw", user_type="staff")
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        self.variant = ProductVariant.objects.create(product=product, size="5L", price=500, stock=10)
+
+    def _race(self, order, targets):
+        barrier = threading.Barrier(len(targets))
+        outcomes = []
+
+        def worker(target):
+            stale = Order.objects.get(pk=order.pk)  # everyone starts from the same snapshot
+            barrier.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        transition(stale, target, user=self.user)
+                        outcomes.append(("won", target))
+                        return
+                    except OperationalError:
+                        # SQLite reports a competing writer as "locked"; retry
+                        time.sleep(0.01)
+            except TransitionConflict:
+                outcomes.append(("conflict", target))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_complete_and_cancel_race(self):
+        order = make_order(self.user, self.variant, quantity=4)
+        outcomes = self._race(order, ["completed", "cancelled", "completed", "cancelled"])
+
+        winners = [target for result, target in outcomes if result == "won"]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(len(outcomes), 4)
+
+        order.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual(order.status, winners[0])
+        self.assertEqual(self.variant.stock, 6 if winners[0] == "completed" else 10)
+        self.assertEqual(AuditLog.objects.filter(order=order).count(), 1)
+
+
+class FacetCountTests(TestCase):
+    def test_signals_keep_counts_and_rebuild_repairs_them(self):
+        product = Product.objects.create(name="Royal Palm", category="palms")
+        ProductVariant.objects.create(product=product, size="5L", price=500, stock=3)
+        variant = ProductVariant.objects.create(product=product, size="10L", price=6000, stock=1)
+        variant.delete()
+        self.assertEqual(find_mismatches(), [])
+        self.assertEqual(facet_counts()["price_band"][1], {"value": "500-999", "count": 1})
+
+        CatalogFacet.objects.filter(kind="category", value="palms").update(count=7)
+        rebuild_facets()
+        self.assertEqual(find_mismatches(), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "needs concurrent writers")
+class FacetRebuildTests(TransactionTestCase):
+    def test_rebuild_waits_for_an_open_bump(self):
+        Product.objects.create(name="Kentia Palm", category="palms")
+        bumped, release = threading.Event(), threading.Event()
+
+        def add_product():
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name="Royal Palm", category="palms")
+                    bumped.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def rebuild():
+            try:
+                rebuild_facets()
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=add_product)
+        writer.start()
+        bumped.wait(5)
+        rebuilder = threading.Thread(target=rebuild)
+        rebuilder.start()
+        rebuilder.join(0.3)  # blocked on the writer's bump
+        release.set()
+        writer.join()
+        rebuilder.join()
+
+        self.assertEqual(find_mismatches(), [])
+        self.assertEqual(facet_counts()["category"], [{"value": "palms", "count": 2}])
+
+
+class CatalogImportTests(TestCase):
+    def test_malformed_rows_are_reported_not_raised(self):
+        rows = [
+            "Royal Palm",
+            {"name": "Fern", "category": "ferns", "variants": "5L"},
+            {"name": "Fern", "category": "ferns", "variants": [{"size": "5L", "price": "NaN"}, 7]},
+            {"name": "Fern", "category": "ferns", "price": "100000000"},
+            {"name": "Fern", "category": "ferns", "price": "1.005"},
+            {"name": "F" * 300, "category": "ferns", "price": "10"},
+            {"name": "Fern", "category": "ferns", "size": "S" * 60, "price": "10"},
+            {"name": "Fern", "category": "ferns", "price": "10", "stock": -1},
+            {"name": "Fern", "category": "ferns", "size": "5L", "price": "10", "stock": 4},
+        ]
+        stats = import_catalog(read_rows(io.StringIO(json.dumps(rows)), "json"))
+        self.assertEqual(stats["errors"], 9)
+        self.assertEqual(stats["variants_created"], 1)
+        self.assertEqual(ProductVariant.objects.get(product__name="Fern").stock, 4)
+
+    def test_json_must_be_a_list(self):
+        with self.assertRaises(ValueError):
+            list(read_rows(io.StringIO('{"products": 5}'), "json"))
@@ -1,18 +1,50 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 
-from .models import Product, ProductVariant, Order, AuditLog
+from BackEnd import events
+from BackEnd.conditional import ConditionalGetMixin
+from BackEnd.replicas import ReplicaReadMixin
+
+from .models import Product, ProductVariant, Order, OrderTombstone, AuditLog
+from . import audit
+from .catalog_import import flatten_products, import_catalog, read_rows
 from .serializers import (
     ProductSerializer,
     ProductVariantSerializer,
     OrderSerializer,
     RestockSerializer,
+    BulkRestockSerializer,
+    ProductSearchSerializer,
+    AuditLogFilterSerializer,
+    ChangeFeedSerializer,
     AuditLogSerializer,
 )
+from .search import search_products
+from .facets import facet_counts
+from .images import srcset
+from .changefeed import changes_since
+from .fast_serializers import (
+    ORDER_EXPANDABLE,
+    ORDER_FIELDS,
+    PRODUCT_EXPANDABLE,
+    PRODUCT_FIELDS,
+    order_list,
+    product_list,
+    requested_shape,
+)
+from .inventory import restock_variants
+from .state_machine import InvalidTransition, TransitionConflict, transition
+
+def _single(rows):
+    if not rows:
+        raise NotFound()
+    return rows[0]
+
 
 def is_admin_or_staff(user):
     """Helper function to check if a user is superuser, staff, or has the admin/staff user_type."""
@@ -26,10 +58,29 @@ def is_admin_or_staff(user):
     return hasattr(user, 'user_type') and user.user_type in ['admin', 'staff']
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().prefetch_related('variants')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] 
+    lookup_value_regex = r"\d+"
+    # Variants are part of the representation, so their changes and deletions count too
+    version_aggregates = {
+        "updated": Max("updated_at"),
+        "variants_updated": Max("variants__updated_at"),
+        "count": Count("pk", distinct=True),
+        "variants": Count("variants"),
+    }
+
+    def list(self, request, *args, **kwargs):
+        """Product list; ?fields=id,name,price,image and ?expand=variants trim the payload and queries."""
+        fields, expand = requested_shape(request.query_params, PRODUCT_FIELDS, PRODUCT_EXPANDABLE)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional(queryset, lambda: product_list(queryset, request, fields, expand))
+
+    def retrieve(self, request, *args, **kwargs):
+        fields, expand = requested_shape(request.query_params, PRODUCT_FIELDS, PRODUCT_EXPANDABLE)
+        queryset = self.get_queryset().filter(pk=kwargs["pk"])
+        return self.conditional(queryset, lambda: _single(product_list(queryset, request, fields, expand)))
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def restock(self, request, pk=None):
@@ -45,44 +96,141 @@ class ProductViewSet(viewsets.ModelViewSet):
             variant_id = serializer.validated_data['variant_id']
             amount = serializer.validated_data['amount']
             
-            try:
-                variant = product.variants.get(id=variant_id)
-                
-                with transaction.atomic():
-                    variant.stock += amount
-                    variant.save()
-                    
-                    # Create audit log
-                    AuditLog.objects.create(
-                        user=request.user,
-                        action_type="update", # Consider using a more specific action_type like 'product_restock'
-                        description=f"Restocked {product.name} variant {variant.size or 'default'} by {amount}. New stock: {variant.stock}"
-                    )
-                
-                return Response({
-                    "detail": "Restocked successfully",
-                    "new_stock": variant.stock
-                })
-            except ProductVariant.DoesNotExist:
+            if not product.variants.filter(id=variant_id).exists():
                 return Response(
                     {"detail": "Variant not found"},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            
+            new_stock, missing = restock_variants([(variant_id, amount)], request.user)
+            if missing:  # deleted since the check above
+                return Response(
+                    {"detail": "Variant not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            return Response({
+                "detail": "Restocked successfully",
+                "new_stock": new_stock[variant_id]
+            })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], url_path="bulk-restock", permission_classes=[IsAuthenticated])
+    def bulk_restock(self, request):
+        """Restock many variants across products in one request (Admin/Staff only)."""
+        if not is_admin_or_staff(request.user):
+            raise PermissionDenied("You do not have permission to restock products.")
+        
+        serializer = BulkRestockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        new_stock, missing = restock_variants(
+            ((item["variant_id"], item["amount"]) for item in serializer.validated_data["items"]),
+            request.user
+        )
+        
+        return Response({
+            "detail": f"Restocked {len(new_stock)} variant(s)",
+            "new_stock": [{"variant_id": v, "stock": stock} for v, stock in new_stock.items()],
+            "missing_variant_ids": missing,
+        })
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Ranked, faceted catalog search.
+        Query params: q, category, min_price, max_price, in_stock=1,
+        sort=relevance|price|-price|name|-created_at, limit, offset.
+        """
+        params = ProductSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+
+        products, facets = search_products(
+            query=options.get("q", ""),
+            category=options.get("category"),
+            min_price=options.get("min_price"),
+            max_price=options.get("max_price"),
+            in_stock=options.get("in_stock", False),
+            sort=options.get("sort", "relevance"),
+        )
+        offset, limit = options.get("offset", 0), options.get("limit", 24)
+        rows = products.values(
+            "id", "name", "category", "image", "image_renditions", "min_price", "in_stock"
+        )[offset:offset + limit]
+
+        return Response({
+            "count": products.count(),
+            "results": [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "category": row["category"],
+                    "image": request.build_absolute_uri(default_storage.url(row["image"])) if row["image"] else None,
+                    "image_srcset": srcset(row["image_renditions"], request.build_absolute_uri),
+                    "price": float(row["min_price"] or 0),
+                    "in_stock": row["in_stock"],
+                }
+                for row in rows
+            ],
+            "facets": facets,
+        })
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """Category and price-band counts for the whole catalog (precomputed)."""
+        return Response(facet_counts())
 
-class ProductVariantViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["post"], url_path="import", permission_classes=[IsAuthenticated])
+    def import_catalog(self, request):
+        """
+        Bulk import/update products and variants (Admin only).
+        Accepts a CSV/JSON upload in `file` or a JSON body ({"products": [...]});
+        pass ?dry_run=1 to only report what would change.
+        """
+        user = request.user
+        if not (user.is_superuser or getattr(user, "user_type", None) == "admin"):
+            raise PermissionDenied("Only administrators can import the catalog.")
+
+        dry_run = request.query_params.get("dry_run", "").lower() in ("1", "true", "yes")
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = "json" if upload.name.lower().endswith(".json") else "csv"
+            rows = read_rows(upload.file, fmt)
+        else:
+            products = request.data.get("products") if isinstance(request.data, dict) else request.data
+            if not isinstance(products, list):
+                raise ValidationError({"detail": "Upload a file or send a list of products."})
+            rows = flatten_products(products)
+
+        try:
+            stats = import_catalog(rows, dry_run=dry_run)
+        except ValueError as exc:
+            raise ValidationError({"detail": f"Could not read catalog: {exc}"})
+
+        return Response(stats)
+
+
+class ProductVariantViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all().select_related('product')
     serializer_class = ProductVariantSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     # Eagerly load user and the new 'last_modified_by' field for efficiency
     queryset = Order.objects.all().select_related("user", "last_modified_by").prefetch_related("items__variant")
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated] 
+    lookup_value_regex = r"\d+"
+    # Items embed their variant and orders their user, so changes to those count too
+    version_aggregates = {
+        "updated": Max("updated_at"),
+        "variants_updated": Max("items__variant__updated_at"),
+        "user_updated": Max("user__updated_at"),
+        "count": Count("pk", distinct=True),
+    }
 
     def get_queryset(self):
         """Filter orders based on user role (Admin/Staff see all, Customer sees their own)"""
@@ -93,17 +241,58 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Customer sees only their own orders
         return self.queryset.filter(user=user)
 
+    def list(self, request, *args, **kwargs):
+        """Order list; ?fields= and ?expand=user,items,items.variant trim the payload and queries."""
+        fields, expand = requested_shape(request.query_params, ORDER_FIELDS, ORDER_EXPANDABLE)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional(queryset, lambda: order_list(queryset, request, fields, expand))
+
+    def retrieve(self, request, *args, **kwargs):
+        fields, expand = requested_shape(request.query_params, ORDER_FIELDS, ORDER_EXPANDABLE)
+        queryset = self.get_queryset().filter(pk=kwargs["pk"])
+        return self.conditional(queryset, lambda: _single(order_list(queryset, request, fields, expand)))
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-        # Audit log for creation
-        order_instance = serializer.instance
-        AuditLog.objects.create(
-            user=self.request.user,
-            order=order_instance,
-            action_type="order_create",
-            description=f"Order #{order_instance.id} created by customer {self.request.user.username}."
-        )
+        # The order and its audit row commit together
+        with audit.atomic():
+            serializer.save(user=self.request.user)
+            # Audit log for creation
+            order_instance = serializer.instance
+            audit.record(
+                user=self.request.user,
+                order=order_instance,
+                action_type="order_create",
+                new_status=order_instance.status,
+                description=f"Order #{order_instance.id} created by customer {self.request.user.username}."
+            )
+            events.publish(
+                events.ORDER_CREATED,
+                order_id=order_instance.id,
+                user_id=order_instance.user_id,
+                status=order_instance.status,
+                total_price=order_instance.total_price,
+                change_seq=order_instance.change_seq,
+            )
 
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Incremental sync: orders changed after ?since=<seq>, oldest first, up to ?limit=.
+        Returns {"cursor", "has_more", "changes": [{"seq", "op", "order"}]} with op one of
+        upsert / cancelled / deleted; send `cursor` back as `since` on the next call.
+        """
+        params = ChangeFeedSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+
+        orders, tombstones = Order.objects.all(), OrderTombstone.objects.all()
+        if not is_admin_or_staff(request.user):
+            orders, tombstones = orders.filter(user=request.user), tombstones.filter(user_id=request.user.id)
+
+        changes, cursor, has_more = changes_since(
+            orders, tombstones, since=options.get("since", 0), limit=options.get("limit", 200)
+        )
+        return Response({"cursor": cursor, "has_more": has_more, "changes": changes})
 
     @action(detail=True, methods=["post"])
     def set_status(self, request, pk=None):
@@ -122,36 +311,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.status == new_status:
             return Response({"detail": f"Order status is already {new_status}"}, status=status.HTTP_200_OK)
 
-        old_status = order.status
-        
-        with transaction.atomic():
-            if new_status == "completed":
-                if old_status == "completed":
-                    pass 
-                elif old_status == "cancelled":
-                    raise ValidationError({"detail": "Cannot complete a cancelled order."})
-                else:
-                    # Deduct stock for all items
-                    for item in order.items.all():
-                        if item.variant.stock < item.quantity:
-                            raise ValidationError({
-                                "detail": f"Not enough stock for {item.variant.product.name} ({item.variant.size}). Required: {item.quantity}, Available: {item.variant.stock}"
-                            })
-                        item.variant.stock -= item.quantity
-                        item.variant.save()
-
-            # 🟢 AUDIT STEP 1: Update order fields
-            order.status = new_status
-            order.last_modified_by = user
-            order.save(update_fields=["status", "last_modified_by"])
-
-            # 🟢 AUDIT STEP 2: Create detailed audit log entry
-            AuditLog.objects.create(
-                user=user,
-                order=order,
-                action_type="order_status_update",
-                description=f"Status changed from '{old_status}' to '{new_status}'. Handled by: {user.username} (ID: {user.id})."
-            )
+        try:
+            # Guarded, race-safe change; stock/payment side effects and the audit entry run inside it
+            transition(order, new_status, user=user)
+        except TransitionConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except InvalidTransition as exc:
+            raise ValidationError({"detail": str(exc)})
 
         return Response(OrderSerializer(order, context={"request": request}).data)
 
@@ -171,19 +337,18 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         old_status = order.status
         
-        with transaction.atomic():
-            # 🟢 AUDIT STEP 1: Update order fields
-            order.status = 'cancelled'
-            order.last_modified_by = user
-            order.save(update_fields=["status", "last_modified_by"])
-
-            # 🟢 AUDIT STEP 2: Create detailed audit log entry
-            AuditLog.objects.create(
+        try:
+            transition(
+                order,
+                'cancelled',
                 user=user,
-                order=order,
                 action_type='order_cancel',
-                description=f"Order explicitly cancelled (from status '{old_status}'). Handled by: {user.username} (ID: {user.id})."
+                description=f"Order explicitly cancelled (from status '{old_status}'). Handled by: {user.username} (ID: {user.id}).",
             )
+        except TransitionConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except InvalidTransition as exc:
+            raise ValidationError({"detail": str(exc)})
         
         return Response(OrderSerializer(order, context={"request": request}).data)
 
@@ -197,7 +362,32 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Only admins/staff can see audit logs"""
         user = self.request.user
-        if is_admin_or_staff(user):
-            return self.queryset
-        # Non-admin/staff users see nothing
-        return AuditLog.objects.none()
+        if not is_admin_or_staff(user):
+            # Non-admin/staff users see nothing
+            return AuditLog.objects.none()
+        if self.action == "list":
+            return self.filter_queryset_by_params(self.queryset)
+        return self.queryset
+
+    def filter_queryset_by_params(self, queryset):
+        """
+        ?order=, ?user=, ?action_type=, ?start= (or ?since=), ?end= (see DateWindowSerializer).
+
+        Each filter is served by an (x, -created_at) index. Nothing is bounded by default;
+        pass ?start= to keep a listing to the recent monthly partitions.
+        """
+        params = AuditLogFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+
+        if "order" in options:
+            queryset = queryset.filter(order_id=options["order"])
+        if "user" in options:
+            queryset = queryset.filter(user_id=options["user"])
+        if "action_type" in options:
+            queryset = queryset.filter(action_type=options["action_type"])
+        if "start" in options:
+            queryset = queryset.filter(created_at__gte=options["start"])
+        if "end" in options:
+            queryset = queryset.filter(created_at__lt=options["end"])
+        return queryset
@@ -0,0 +1,121 @@
+"""
+Gunicorn settings for the web process (Procfile: `gunicorn --config gunicorn.conf.py`).
+
+GUNICORN_WORKER_CLASS picks the worker model:
+
+  sync     one request at a time per process; 2 x CPUs + 1 workers
+  gthread  CPUs + 1 processes with GUNICORN_THREADS threads each (default). Threads
+           share a process, so memory per concurrent request is much lower, and slow
+           gateway calls (STK push, token refresh) only block their own thread.
+  uvicorn  the ASGI app (BackEnd.asgi) with an event loop per process. The staff
+           WebSocket at /ws/staff/events/ is ONLY served by this model: set
+           GUNICORN_WORKER_CLASS=uvicorn (or run a second service with it) for live
+           dashboards. It is not the default because Django runs sync views one at a
+           time per process under ASGI.
+
+WEB_CONCURRENCY overrides the worker count. The app is preloaded in the master and forked,
+so workers share its imported code copy-on-write; nothing connects to the database or
+starts a thread at import time (connections, pools and the audit writer are created on
+first use in each worker).
+"""
+import gc
+import os
+
+# Workers write their metrics here so /metrics can aggregate them (see BackEnd/metrics.py).
+# Set before the app, and with it prometheus_client, is loaded: preloading imports it
+# before any server hook runs. The directory is emptied in on_starting.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/karathi-metrics")
+
+
+def cpu_count():
+    """CPUs this container may use: the cgroup quota when there is one, else the affinity mask."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "uvicorn": "uvicorn_worker.UvicornWorker",
+}
+worker_model = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_model not in WORKER_CLASSES:
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, not {worker_model!r}")
+
+cpus = cpu_count()
+worker_class = WORKER_CLASSES[worker_model]
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * cpus + 1 if worker_model == "sync" else cpus + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4")) if worker_model == "gthread" else 1
+wsgi_app = "BackEnd.asgi:application" if worker_model == "uvicorn" else "BackEnd.wsgi:application"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle workers to cap slow memory growth; the jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Payment gateway callbacks arrive through the platform proxy, which reuses connections
+# for up to 60 s; keep them open longer so the proxy, not gunicorn, closes idle ones.
+# (Sync workers do not do keep-alive.)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+# Above the 30 s gateway request timeout used by the payment services
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "45"))
+graceful_timeout = 30
+
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers into timeouts
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+# Only these peers may set X-Forwarded-For/-Proto: the platform proxy's addresses. "*" is
+# safe only when the app cannot be reached except through the proxy.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+# Requests are logged by BackEnd.logs.RequestIDMiddleware, as JSON with the request id
+accesslog = None
+errorlog = "-"
+
+
+def prepare_metrics_dir(path):
+    """
+    Delete the value files a previous run left in `path` (they would be added to this
+    run's), creating it if needed. Refuses anything but a directory of metrics files.
+    """
+    if not path or not os.path.isabs(path):
+        raise RuntimeError(f"PROMETHEUS_MULTIPROC_DIR must be an absolute path, not {path!r}")
+    if os.path.lexists(path) and (os.path.islink(path) or not os.path.isdir(path)):
+        raise RuntimeError(f"PROMETHEUS_MULTIPROC_DIR={path} is not a directory")
+    os.makedirs(path, exist_ok=True)
+    names = os.listdir(path)
+    others = sorted(
+        name for name in names
+        if not (name.endswith(".db") and os.path.isfile(os.path.join(path, name)))
+    )
+    if others:
+        raise RuntimeError(
+            f"PROMETHEUS_MULTIPROC_DIR={path} holds more than metrics files ({', '.join(others[:5])}); "
+            "point it at a directory of its own"
+        )
+    for name in names:
+        os.remove(os.path.join(path, name))
+
+
+def on_starting(server):
+    # The preloaded app only defines labelled metrics, so no worker value exists yet
+    prepare_metrics_dir(os.environ.get("PROMETHEUS_MULTIPROC_DIR", ""))
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated out of the garbage collector's reach, so
+    # collections in the workers do not write to (and un-share) those pages
+    if preload_app:
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)